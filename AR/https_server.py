@@ -2,22 +2,61 @@
 """
 HTTPS server for AR Fitness App
 Serves the app over HTTPS to enable camera access on mobile devices
+
+With --production the app is served from memory instead: every asset is
+loaded and precompressed (gzip, plus brotli when installed) at startup,
+responses carry strong ETags and answer If-None-Match with 304, and HTML
+pages reference content-hashed asset URLs (js/app.<hash>.js) that are
+cached as immutable. Each connection gets its own thread, which does the
+TLS handshake and then serves keep-alive requests until the client has
+been idle for KEEPALIVE_TIMEOUT.
 """
 
+import gzip
+import hashlib
 import http.server
+import mimetypes
+import re
 import ssl
 import os
+import posixpath
 import sys
 from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Production asset cache
+COMPRESSIBLE_EXTENSIONS = {'.html', '.js', '.css', '.json', '.svg', '.txt', '.map', '.wasm', '.gltf'}
+ASSET_EXTENSIONS = COMPRESSIBLE_EXTENSIONS | {
+    '.png', '.jpg', '.jpeg', '.gif', '.ico', '.webp', '.glb', '.bin', '.woff', '.woff2', '.mp3', '.mp4',
+}
+SKIP_DIRS = {'ssl', 'relay-server', '__pycache__'}  # never served in production
+HASH_LENGTH = 10  # hex digits of the content hash in immutable URLs
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'  # may be stored, but revalidated with the ETag
+HANDSHAKE_TIMEOUT = 10  # seconds
+KEEPALIVE_TIMEOUT = 30  # seconds an idle connection keeps its thread
+# src="..." / href="..." pointing at a file of this app (no scheme, no //host)
+LOCAL_REF = re.compile(r'(\b(?:src|href)=")(?!//)([^"#?:]+)(")')
+
 
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """Custom HTTP request handler with better MIME types and CORS support"""
+
+    timeout = KEEPALIVE_TIMEOUT  # applied to the socket in setup()
     
-    def end_headers(self):
+    def send_cors_headers(self):
         # Add CORS headers to allow cross-origin requests
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+    
+    def end_headers(self):
+        self.send_cors_headers()
         # Prevent caching for development
         self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
         super().end_headers()
@@ -31,10 +70,199 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         """Custom log format"""
         print(f"[{self.log_date_time_string()}] {format % args}")
 
+
+class Asset:
+    """One file held in memory with its precompressed variants"""
+
+    def __init__(self, body, content_type, compressible):
+        self.content_type = content_type
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.bodies = {'identity': body}
+        if compressible:
+            gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(gzipped) < len(body):
+                self.bodies['gzip'] = gzipped
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.bodies['br'] = compressed
+
+    def negotiate(self, accept_encoding):
+        """Smallest representation the client accepts: (encoding, body, etag)"""
+        accepted = set()
+        for part in (accept_encoding or '').split(','):
+            name, _, params = part.partition(';')
+            if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(name.strip().lower())
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.bodies:
+                return encoding, self.bodies[encoding], f'"{self.etag}-{encoding}"'
+        return 'identity', self.bodies['identity'], f'"{self.etag}"'
+
+    def matches(self, if_none_match):
+        """Whether an If-None-Match header names any variant of this content"""
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*':
+                return True
+            tag = tag.removeprefix('W/').strip('"')
+            if tag == self.etag or tag.startswith(self.etag + '-'):
+                return True
+        return False
+
+
+class AssetCache:
+    """URL path -> (Asset, Cache-Control) for everything the app serves"""
+
+    def __init__(self, root):
+        self.root = Path(root).resolve()
+        self.entries = {}
+        self.hashed_urls = {}  # '/js/app.js' -> '/js/app.<hash>.js'
+
+        files = []
+        for directory, subdirs, names in os.walk(self.root):
+            subdirs[:] = [d for d in subdirs if d not in SKIP_DIRS and not d.startswith('.')]
+            for name in names:
+                path = Path(directory) / name
+                if path.suffix.lower() in ASSET_EXTENSIONS:
+                    files.append(path)
+
+        # Assets first, so that pages can be rewritten to their hashed URLs
+        pages = [path for path in files if path.suffix.lower() == '.html']
+        for path in files:
+            if path.suffix.lower() != '.html':
+                self.add_asset(path, path.read_bytes())
+        for path in pages:
+            self.add_page(path)
+
+        if '/index.html' in self.entries:
+            self.entries['/'] = self.entries['/index.html']
+
+    def url(self, path):
+        return '/' + path.relative_to(self.root).as_posix()
+
+    def add_asset(self, path, body):
+        suffix = path.suffix.lower()
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        asset = Asset(body, content_type, suffix in COMPRESSIBLE_EXTENSIONS)
+        url = self.url(path)
+        hashed = url[:-len(path.suffix)] + '.' + asset.etag[:HASH_LENGTH] + path.suffix
+        self.entries[url] = (asset, REVALIDATE_CACHE)
+        self.entries[hashed] = (asset, IMMUTABLE_CACHE)
+        self.hashed_urls[url] = hashed
+
+    def add_page(self, path):
+        html = path.read_text(encoding='utf-8')
+        base = self.url(path).rsplit('/', 1)[0] + '/'
+
+        def to_hashed(match):
+            ref = match.group(2)
+            absolute = ref.startswith('/')
+            target = posixpath.normpath(ref if absolute else base + ref)
+            hashed = self.hashed_urls.get(target)
+            if hashed is None:
+                return match.group(0)
+            if not absolute:
+                hashed = posixpath.relpath(hashed, base)
+            return match.group(1) + hashed + match.group(3)
+
+        body = LOCAL_REF.sub(to_hashed, html).encode('utf-8')
+        content_type = 'text/html; charset=utf-8'
+        self.entries[self.url(path)] = (Asset(body, content_type, True), REVALIDATE_CACHE)
+
+    def get(self, url_path):
+        return self.entries.get(url_path)
+
+    def stats(self):
+        assets = {id(asset): asset for asset, _ in self.entries.values()}.values()
+        raw = sum(len(asset.bodies['identity']) for asset in assets)
+        smallest = sum(min(len(body) for body in asset.bodies.values()) for asset in assets)
+        return len(assets), raw, smallest
+
+
+class ProductionRequestHandler(CustomHTTPRequestHandler):
+    """Serves only the in-memory asset cache, with validators and keep-alive"""
+
+    protocol_version = 'HTTP/1.1'
+    cache = None  # AssetCache, set before the server starts
+
+    def end_headers(self):
+        # Caching is decided per response, not disabled globally
+        self.send_cors_headers()
+        http.server.SimpleHTTPRequestHandler.end_headers(self)
+
+    def do_GET(self):
+        self.serve(head_only=False)
+
+    def do_HEAD(self):
+        self.serve(head_only=True)
+
+    def serve(self, head_only):
+        entry = self.cache.get(unquote(urlsplit(self.path).path))
+        if entry is None:
+            self.send_error(404, 'File not found')
+            return
+        asset, cache_control = entry
+        encoding, body, etag = asset.negotiate(self.headers.get('Accept-Encoding'))
+
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match and asset.matches(if_none_match):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+
+class ThreadingHTTPSServer(http.server.ThreadingHTTPServer):
+    """Thread per connection; TLS is negotiated on that thread, not in accept()"""
+
+    def __init__(self, server_address, handler_class, ssl_context):
+        super().__init__(server_address, handler_class)
+        self.ssl_context = ssl_context
+
+    def finish_request(self, request, client_address):
+        request.settimeout(HANDSHAKE_TIMEOUT)
+        try:
+            tls_request = self.ssl_context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            return
+        try:
+            self.RequestHandlerClass(tls_request, client_address, self)
+        finally:
+            self.shutdown_request(tls_request)
+
+
 def main():
     # Configuration
     HOST = '0.0.0.0'  # Listen on all interfaces
     PORT = 8000
+    production = False
+    
+    for arg in sys.argv[1:]:
+        if arg.isdigit():
+            PORT = int(arg)
+        elif arg == '--production':
+            production = True
+        elif arg in ['--help', '-h']:
+            print("\nUsage: python https_server.py [PORT] [--production]")
+            print("\n  --production  Serve precompressed assets from memory with ETags,")
+            print("                immutable hashed URLs and a threaded server\n")
+            return 0
     
     # SSL certificate paths
     ssl_dir = Path('ssl')
@@ -57,18 +285,26 @@ def main():
     # Create HTTPS server
     try:
         server_address = (HOST, PORT)
-        httpd = http.server.HTTPServer(server_address, CustomHTTPRequestHandler)
-        
-        # Wrap with SSL
         context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
         context.load_cert_chain(certfile=str(cert_file), keyfile=str(key_file))
-        httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+        
+        if production:
+            ProductionRequestHandler.cache = AssetCache('.')
+            httpd = ThreadingHTTPSServer(server_address, ProductionRequestHandler, context)
+        else:
+            httpd = http.server.HTTPServer(server_address, CustomHTTPRequestHandler)
+            # Wrap with SSL
+            httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
         
         print("\n" + "=" * 60)
-        print("AR Fitness App - HTTPS Server")
+        print("AR Fitness App - HTTPS Server" + (" (production)" if production else ""))
         print("=" * 60)
         print(f"\n✓ Server running on https://{HOST}:{PORT}")
         print(f"✓ Using SSL certificates from: {ssl_dir}")
+        if production:
+            count, raw, compressed = ProductionRequestHandler.cache.stats()
+            encodings = "gzip + brotli" if brotli is not None else "gzip"
+            print(f"✓ Cached {count} assets: {raw // 1024} KB, {compressed // 1024} KB compressed ({encodings})")
         print("\n" + "=" * 60)
         print("Access URLs:")
         print("=" * 60)
@@ -1,3 +1,8 @@
+// Binary pose_data frame layout, must match AR/relay-server/pose_frame.py
+const POSE_FRAME_VERSION = 1
+const POSE_HEADER_SIZE = 20
+const POSE_EXERCISE_IDS = { 'bicep-curls': 1, 'squats': 2, 'lateral-raises': 3, 'push-ups': 4 }
+
 class DummyDataProvider {
   constructor() {
     this.isActive = false
@@ -18,8 +23,10 @@ class DummyDataProvider {
       enabled: true,
       url: '',  // Will be auto-configured based on detected IP
       reconnectInterval: 5000,
-      maxReconnectAttempts: 10
+      maxReconnectAttempts: 10,
+      binaryPose: true  // send pose_data as packed binary frames
     }
+    this.poseSequence = 0
     this.relayConnection = null
     this.isConnectedToRelay = false
     this.reconnectAttempts = 0
@@ -217,6 +224,8 @@ class DummyDataProvider {
     try {
       console.log(`Connecting to relay node at ${this.relayNodeConfig.url}`)
       this.relayConnection = new WebSocket(this.relayNodeConfig.url)
+      // Binary frames carry MessagePack when the server agreed to it at registration
+      this.relayConnection.binaryType = 'arraybuffer'
 
       this.relayConnection.onopen = () => {
         console.log('='.repeat(50))
@@ -239,6 +248,8 @@ class DummyDataProvider {
           type: 'device_register',
           deviceId: this.deviceId,
           exerciseType: this.exerciseType,
+          // Offer MessagePack only if a decoder (@msgpack/msgpack) is loaded
+          codecs: typeof MessagePack !== 'undefined' ? ['msgpack', 'json'] : ['json'],
           timestamp: Date.now()
         })
         
@@ -251,7 +262,9 @@ class DummyDataProvider {
           this.messageCount++
           this.lastMessageTime = Date.now()
           
-          const data = JSON.parse(event.data)
+          const data = typeof event.data === 'string'
+            ? JSON.parse(event.data)
+            : MessagePack.decode(new Uint8Array(event.data))
           const messageType = data.type || 'unknown'
           
           // Log message type prominently for AI feedback
@@ -545,6 +558,10 @@ class DummyDataProvider {
   }
 
   sendPoseDataToRelay(poseData) {
+    if (this.relayNodeConfig.binaryPose) {
+      this.sendBinaryPoseToRelay(poseData.keypoints || [])
+      return
+    }
     this.sendToRelay({
       type: 'pose_data',
       deviceId: this.deviceId,
@@ -556,6 +573,36 @@ class DummyDataProvider {
     })
   }
 
+  // Packs keypoints as float32 (x, y, score) after a 20-byte header, avoiding
+  // JSON encoding on the phone and parsing on the relay for every frame
+  sendBinaryPoseToRelay(keypoints) {
+    if (!this.relayConnection || this.relayConnection.readyState !== WebSocket.OPEN) {
+      return
+    }
+    const buffer = new ArrayBuffer(POSE_HEADER_SIZE + keypoints.length * 12)
+    const header = new DataView(buffer, 0, POSE_HEADER_SIZE)
+    header.setUint8(0, POSE_FRAME_VERSION)
+    header.setUint8(1, POSE_EXERCISE_IDS[this.exerciseType] || 0)
+    header.setUint16(2, 0, true)  // 0 = this connection
+    header.setUint32(4, this.poseSequence++ >>> 0, true)
+    header.setFloat64(8, Date.now(), true)
+    header.setUint16(16, keypoints.length, true)
+
+    // Float32Array uses platform byte order, little-endian on all phones
+    const values = new Float32Array(buffer, POSE_HEADER_SIZE)
+    keypoints.forEach((kp, i) => {
+      values[i * 3] = kp.x
+      values[i * 3 + 1] = kp.y
+      values[i * 3 + 2] = kp.score ?? 0
+    })
+
+    try {
+      this.relayConnection.send(buffer)
+    } catch (error) {
+      console.error('Failed to send pose frame to relay:', error)
+    }
+  }
+
   sendRepDetectionToRelay(repCount) {
     this.sendToRelay({
       type: 'rep_detection',
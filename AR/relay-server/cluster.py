@@ -0,0 +1,313 @@
+"""Multi-process mode for the relay server.
+
+`python server.py --workers=N` starts N worker processes that all accept on
+the same port through SO_REUSEPORT, so the kernel spreads connections (and
+their TLS and JSON work) over N cores. The parent process serves no
+WebSockets itself: it owns the console and the relay bridge and talks to
+the workers over a Unix socket, one JSON message per line:
+
+    worker -> hub   {"op": "hello", "worker": 0}
+                    {"op": "device", "id": ..., "index": 3, "status": "online"}
+                    (status is online, offline or evicted)
+    hub -> worker   {"op": "command", "action": "start", "args": ["3"]}
+                    {"op": "pair", "tracker": 1, "device": ...}
+                    {"op": "relay", "event": "biometrics", "data": {...}, "online": 2}
+                    (classifier results go only to the worker that owns the
+                    target device; "online": null asks every worker to fall
+                    back to all of its devices, as a single process would)
+
+Worker w hands out device indices w+1, w+1+N, w+1+2N, ..., so a console
+command for an index goes straight to the worker that owns it; commands
+for a device id are routed using the devices the workers announced.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+
+from metrics import install_uvloop
+from relay_bridge import RelayBridge
+
+WORKER_START_DELAY = 2.0  # seconds to let workers bind before the console starts
+
+
+def supported():
+    return hasattr(socket, "SO_REUSEPORT") and hasattr(socket, "AF_UNIX")
+
+
+def hub_path(port):
+    return os.path.join(tempfile.gettempdir(), f"fitness-relay-{port}.sock")
+
+
+def reuseport_socket(port, host="0.0.0.0"):
+    """Listening socket that several processes can bind to the same port"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(socket.SOMAXCONN)
+    sock.setblocking(False)
+    return sock
+
+
+def write_message(writer, message):
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+class ClusterLink:
+    """Worker side of the hub connection."""
+
+    def __init__(self, server, worker):
+        self.server = server
+        self.worker = worker
+        self.reader = self.writer = None
+
+    async def connect(self, path):
+        self.reader, self.writer = await asyncio.open_unix_connection(path)
+        write_message(self.writer, {"op": "hello", "worker": self.worker})
+
+    def announce(self, session, status):
+        write_message(self.writer, {
+            "op": "device", "id": session.device_id, "index": session.index, "status": status,
+        })
+
+    async def run(self):
+        """Handles hub messages until the parent process goes away"""
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                print(f"⚠️  Worker {self.worker}: lost connection to the cluster hub")
+                return
+            try:
+                self.dispatch(json.loads(line))
+            except Exception as e:
+                print(f"Worker {self.worker}: error handling hub message: {e}")
+
+    def dispatch(self, message):
+        op = message.get("op")
+        if op == "command":
+            asyncio.ensure_future(self.server.execute_command(message["action"], message["args"]))
+        elif op == "pair":
+            self.server.tracker_pairing[message["tracker"]] = message["device"]
+        elif op == "relay":
+            if message["event"] == "biometrics":
+                self.server.on_relay_biometrics(message["data"], message["online"])
+            else:
+                self.server.on_relay_result(message["data"], message["online"])
+
+
+class ClusterHub:
+    """Parent side: routes console commands and relay events to workers."""
+
+    def __init__(self, workers):
+        from server import EXERCISE_BY_MODE
+
+        self.workers = workers
+        self.links = {}  # worker -> StreamWriter
+        self.devices = {}  # device_id -> (worker, index, online)
+        self.by_index = {}  # index -> device_id
+        self.tracker_pairing = {}  # tracker index -> device_id
+        self.exercise_modes = EXERCISE_BY_MODE
+        self.active_tracker = 0
+
+    async def start(self, path):
+        if os.path.exists(path):
+            os.unlink(path)  # left over from a previous run
+        self.server = await asyncio.start_unix_server(self.handle_worker, path)
+
+    async def handle_worker(self, reader, writer):
+        worker = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message["op"] == "hello":
+                    worker = message["worker"]
+                    self.links[worker] = writer
+                elif message["op"] == "device":
+                    self.on_device(worker, message)
+        finally:
+            if worker is not None:
+                print(f"⚠️  Worker {worker} exited")
+                self.links.pop(worker, None)
+                for device_id, (owner, index, _) in list(self.devices.items()):
+                    if owner == worker:
+                        del self.devices[device_id]
+                        self.by_index.pop(index, None)
+
+    def on_device(self, worker, message):
+        device_id, index = message["id"], message["index"]
+        if message["status"] == "evicted":
+            if self.devices.get(device_id, (worker,))[0] == worker:
+                self.devices.pop(device_id, None)
+            if self.by_index.get(index) == device_id:
+                del self.by_index[index]
+            return
+        self.devices[device_id] = (worker, index, message["status"] == "online")
+        self.by_index[index] = device_id
+
+    def online(self):
+        return sum(1 for _, _, online in self.devices.values() if online)
+
+    def send(self, worker, message):
+        writer = self.links.get(worker)
+        if writer is None:
+            return False
+        write_message(writer, message)
+        return True
+
+    def publish(self, message):
+        for worker in list(self.links):
+            self.send(worker, message)
+
+    def resolve(self, identifier):
+        """Device id for an index or device id known to any worker"""
+        if identifier.isdigit():
+            return self.by_index.get(int(identifier))
+        return identifier if identifier in self.devices else None
+
+    def dispatch(self, action, args):
+        """Console command handler; runs on the hub's event loop"""
+        if action == "list":
+            self.list_devices()
+            return
+        if action == "pair":
+            device_id = self.resolve(args[0])
+            if device_id is None:
+                print(f"❌ Device {args[0]} not found. Use 'list' to see devices.")
+                return
+            self.tracker_pairing[int(args[1])] = device_id
+            self.publish({"op": "pair", "tracker": int(args[1]), "device": device_id})
+            print(f"🔗 Tracker {args[1]} → device {device_id[:8]}...")
+            return
+
+        command = {"op": "command", "action": action, "args": args}
+        if args[0] == "all":
+            self.publish(command)
+            return
+        if args[0].isdigit():
+            # Index ranges are interleaved between workers, see SessionRegistry
+            worker = (int(args[0]) - 1) % self.workers
+        else:
+            worker = self.devices.get(args[0], (None,))[0]
+        if worker is None or not self.send(worker, command):
+            print(f"❌ Device {args[0]} not found. Use 'list' to see devices.")
+
+    def list_devices(self):
+        if not self.devices:
+            print("\n📱 No devices connected")
+            return
+        print("\n" + "=" * 70)
+        print(f"📱 CONNECTED DEVICES ({len(self.links)} workers)")
+        print("=" * 70)
+        for device_id, (worker, index, online) in sorted(self.devices.items(), key=lambda item: item[1][1]):
+            status = "✓ Online" if online else "✗ Offline"
+            print(f"  [{index}] {device_id} - {status} (worker {worker})")
+        print("=" * 70)
+        print("💡 Tip: Use the index number [1], [2], etc. in commands")
+        print("=" * 70 + "\n")
+
+    def result_worker(self):
+        """Worker owning the device the active tracker's results belong to.
+
+        Mirrors FitnessRelayServer.tracker_targets: pairing, then the device
+        with the tracker's index, then the only online device. None if no
+        online device qualifies.
+        """
+        device_id = self.tracker_pairing.get(self.active_tracker)
+        if device_id is None:
+            device_id = self.by_index.get(self.active_tracker)
+        if device_id is None:
+            online = [device for device, (_, _, is_online) in self.devices.items() if is_online]
+            device_id = online[0] if len(online) == 1 else None
+        worker, _, online = self.devices.get(device_id, (None, None, False))
+        return worker if online else None
+
+    def on_relay_biometrics(self, biometrics):
+        if biometrics.get("mode") in self.exercise_modes:
+            self.active_tracker = biometrics.get("device", 0)
+        # Every worker tracks modes and the active tracker for its own devices
+        self.publish({"op": "relay", "event": "biometrics", "data": biometrics, "online": self.online()})
+
+    def on_relay_result(self, result):
+        worker = self.result_worker()
+        if worker is None:
+            self.publish({"op": "relay", "event": "result", "data": result, "online": None})
+        else:
+            self.send(worker, {"op": "relay", "event": "result", "data": result, "online": self.online()})
+
+
+async def serve_worker(worker, workers, port, use_ssl, path, local_ip, metrics_port, demo_feedback):
+    from server import FitnessRelayServer
+    from session_registry import SessionRegistry
+
+    sessions = SessionRegistry(first_index=worker + 1, index_stride=workers)
+    server = FitnessRelayServer(relay_url=None, sessions=sessions, local_ip=local_ip,
+                                metrics_port=metrics_port + worker if metrics_port else None,
+                                demo_feedback=demo_feedback)
+    link = ClusterLink(server, worker)
+    await link.connect(path)
+    server.cluster = link
+
+    tasks = [
+        asyncio.create_task(server.run(port, use_ssl, sock=reuseport_socket(port), banner=False)),
+        asyncio.create_task(link.run()),
+    ]
+    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+
+
+def worker_main(worker, workers, port, use_ssl, path, local_ip, metrics_port, demo_feedback, use_uvloop):
+    """Entry point of a worker process"""
+    if use_uvloop:
+        install_uvloop()
+    try:
+        asyncio.run(serve_worker(worker, workers, port, use_ssl, path, local_ip, metrics_port, demo_feedback))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_cluster(server, workers, port, use_ssl, use_uvloop=False):
+    """Run the console and relay bridge here and the WebSockets in workers.
+
+    server is the parent's FitnessRelayServer; it only supplies settings
+    (relay URL, local IP, demo feedback, banner) and never accepts connections
+    itself. Workers have no relay of their own, so they get the parent's
+    demo_feedback rather than deriving it.
+    """
+    from server import print_command_intro, start_console
+
+    path = hub_path(port)
+    hub = ClusterHub(workers)
+    await hub.start(path)
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=worker_main,
+                        args=(worker, workers, port, use_ssl, path, server.local_ip, server.metrics_port,
+                              server.demo_feedback, use_uvloop),
+                        daemon=True)
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    server.print_banner(port, use_ssl)
+    print(f"✓ {workers} worker processes sharing port {port}")
+    if server.relay_url:
+        bridge = RelayBridge(server.relay_url, hub.on_relay_biometrics, hub.on_relay_result)
+        asyncio.create_task(bridge.run())
+
+    await asyncio.sleep(WORKER_START_DELAY)
+    print_command_intro()
+    start_console(asyncio.get_running_loop(), hub.dispatch)
+    try:
+        await asyncio.Future()  # Run forever
+    finally:
+        for process in processes:
+            process.terminate()
+        if os.path.exists(path):
+            os.unlink(path)
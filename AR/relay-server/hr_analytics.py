@@ -0,0 +1,152 @@
+"""Streaming heart-rate analytics for the relay server.
+
+Every update is O(1): rolling statistics live in fixed-size ring buffers
+with running sums and monotonic min/max deques, zone time is accumulated
+per sample, and recovery is tracked from the moment a set ends.
+"""
+from collections import deque
+
+WINDOW_SIZE = 30  # samples in the rolling window
+MIN_VALID_HR = 30  # readings outside this range are sensor artefacts
+MAX_VALID_HR = 230
+MAX_SAMPLE_GAP = 5.0  # seconds; longer gaps are not counted as zone time
+RECOVERY_PERIOD = 60.0  # seconds after a set for the recovery (HRR60) reading
+
+DEFAULT_MAX_HR = 190
+# Lower bounds of zones 1-5 as a fraction of max heart rate
+ZONE_BOUNDS = (0.5, 0.6, 0.7, 0.8, 0.9)
+
+
+class RollingWindow:
+    """Fixed-capacity ring buffer with O(1) mean and amortised O(1) min/max."""
+
+    __slots__ = ("capacity", "values", "count", "total", "index", "_min", "_max")
+
+    def __init__(self, capacity=WINDOW_SIZE):
+        self.capacity = capacity
+        self.values = [0] * capacity
+        self.count = 0
+        self.total = 0
+        self.index = 0  # number of values ever pushed
+        self._min = deque()  # (index, value), values increasing
+        self._max = deque()  # (index, value), values decreasing
+
+    def push(self, value):
+        slot = self.index % self.capacity
+        if self.count == self.capacity:
+            self.total -= self.values[slot]
+        else:
+            self.count += 1
+        self.values[slot] = value
+        self.total += value
+
+        oldest = self.index - self.count + 1
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((self.index, value))
+        while self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((self.index, value))
+        while self._max[0][0] < oldest:
+            self._max.popleft()
+        self.index += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def min(self):
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+
+class HeartRateAnalytics:
+    """Per-device heart-rate statistics, updated once per sample."""
+
+    def __init__(self, max_hr=DEFAULT_MAX_HR, window_size=WINDOW_SIZE):
+        self.zone_floors = tuple(int(max_hr * bound) for bound in ZONE_BOUNDS)
+        self.window = RollingWindow(window_size)
+        self.latest = None
+        self.last_time = None
+        self.zone_seconds = [0.0] * (len(ZONE_BOUNDS) + 1)  # index 0 = below zone 1
+        self.accepted = 0
+        self.rejected = 0
+
+        self.active = False
+        self.set_peak = None
+        self.recovery_start = None  # (time, hr) when the last set ended
+        self.recovery_rate = None  # bpm per minute since the set ended
+        self.last_hrr = None  # bpm dropped RECOVERY_PERIOD after the last set
+
+    def zone(self, hr):
+        zone = 0
+        for floor in self.zone_floors:
+            if hr < floor:
+                break
+            zone += 1
+        return zone
+
+    def update(self, hr, now, active=None):
+        """Folds one reading in; returns False if it was rejected as an outlier.
+
+        active marks whether a set is in progress; a True -> False transition
+        starts recovery tracking.
+        """
+        if active is not None and active != self.active:
+            self.active = active
+            if active:
+                self.set_peak = None
+                self.recovery_start = None
+                self.recovery_rate = None
+            elif self.latest is not None:
+                self.recovery_start = (now, self.latest)
+
+        # Zero means no finger on the sensor; anything else out of range is noise.
+        if not MIN_VALID_HR <= hr <= MAX_VALID_HR:
+            self.rejected += 1
+            return False
+
+        if self.last_time is not None and self.latest is not None:
+            dt = now - self.last_time
+            if 0 < dt <= MAX_SAMPLE_GAP:
+                self.zone_seconds[self.zone(self.latest)] += dt
+        self.latest = hr
+        self.last_time = now
+        self.window.push(hr)
+        self.accepted += 1
+
+        if self.active:
+            if self.set_peak is None or hr > self.set_peak:
+                self.set_peak = hr
+        elif self.recovery_start is not None:
+            started, start_hr = self.recovery_start
+            elapsed = now - started
+            if elapsed > 0:
+                self.recovery_rate = (start_hr - hr) * 60.0 / elapsed
+            if elapsed >= RECOVERY_PERIOD:
+                self.last_hrr = start_hr - hr
+                self.recovery_start = None
+        return True
+
+    def snapshot(self):
+        window = self.window
+        mean = window.mean
+        return {
+            "heartRate": self.latest,
+            "zone": self.zone(self.latest) if self.latest is not None else None,
+            "rollingMean": round(mean, 1) if mean is not None else None,
+            "rollingMin": window.min,
+            "rollingMax": window.max,
+            "zoneSeconds": [round(seconds, 1) for seconds in self.zone_seconds],
+            "setPeak": self.set_peak,
+            "recoveryRate": round(self.recovery_rate, 1) if self.recovery_rate is not None else None,
+            "lastRecovery": self.last_hrr,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,294 @@
+"""Load generator for the AR relay server.
+
+Opens many simulated AR clients against a local server. Each client
+registers, then streams pose_data and biometric_data at the configured
+rates. Feedback latency is measured with one probe in flight per client:
+a pose frame is timestamped when sent and the next ai_feedback completes
+the probe (this includes the server's simulated inference delay); other
+messages such as performance_metrics do not.
+
+The server must answer pose frames with feedback, so run it in demo mode:
+--no-relay (as --spawn-server does) or --demo-feedback. Against a server
+bridging a real relay, pose frames get no direct answer and the latency
+figures are meaningless.
+
+    python load_test.py --spawn-server --clients 2000 --duration 30
+
+Results (connections sustained, messages/sec, p50/p99/p999 latency) are
+printed and written to a JSON file so runs can be compared.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import struct
+import subprocess
+import sys
+import time
+
+import websockets
+
+from pose_frame import EXERCISE_TYPES, POSE_FRAME_VERSION, POSE_HEADER
+
+KEYPOINT_COUNT = 17
+CONNECT_TIMEOUT = 10.0  # seconds
+EXERCISES = ("bicep-curls", "squats", "lateral-raises")
+
+
+class ClientStats:
+    __slots__ = ("connected", "failed", "sustained", "sent", "received", "latencies")
+
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.sustained = 0  # still open when the run ended
+        self.sent = 0
+        self.received = 0
+        self.latencies = []  # seconds
+
+    def merge(self, other):
+        self.connected += other.connected
+        self.failed += other.failed
+        self.sustained += other.sustained
+        self.sent += other.sent
+        self.received += other.received
+        self.latencies.extend(other.latencies)
+
+
+def random_keypoints():
+    return [
+        {"x": random.uniform(0, 640), "y": random.uniform(0, 480), "score": random.uniform(0.5, 1.0)}
+        for _ in range(KEYPOINT_COUNT)
+    ]
+
+
+def pose_message(device_id, exercise_type, sequence, binary):
+    keypoints = random_keypoints()
+    if not binary:
+        return json.dumps({
+            "type": "pose_data",
+            "deviceId": device_id,
+            "data": {"keypoints": keypoints, "exerciseType": exercise_type, "timestamp": int(time.time() * 1000)},
+        })
+    header = POSE_HEADER.pack(POSE_FRAME_VERSION, EXERCISE_TYPES.index(exercise_type), 0,
+                              sequence & 0xFFFFFFFF, time.time() * 1000, len(keypoints))
+    values = [value for kp in keypoints for value in (kp["x"], kp["y"], kp["score"])]
+    return header + struct.pack(f"<{len(values)}f", *values)
+
+
+def biometric_message(device_id, exercise_type, rep_count):
+    # Heart rate stays under the server's 150 bpm warning and rep counts skip
+    # multiples of 10, so every ai_feedback answers a pose frame.
+    return json.dumps({
+        "type": "biometric_data",
+        "deviceId": device_id,
+        "data": {
+            "heartRate": random.randint(70, 140),
+            "repCount": rep_count,
+            "exerciseType": exercise_type,
+            "timestamp": int(time.time() * 1000),
+        },
+    })
+
+
+async def simulated_client(url, number, args, stats, deadline):
+    device_id = f"load-{os.getpid()}-{number}"
+    exercise_type = random.choice(EXERCISES)
+    try:
+        websocket = await asyncio.wait_for(websockets.connect(url, max_queue=None), CONNECT_TIMEOUT)
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+        stats.failed += 1
+        return
+    stats.connected += 1
+    probe = None  # send time of the pose frame awaiting feedback
+
+    async def receive():
+        nonlocal probe
+        async for message in websocket:
+            stats.received += 1
+            if probe is not None and json.loads(message).get("type") == "ai_feedback":
+                stats.latencies.append(time.perf_counter() - probe)
+                probe = None
+
+    async def stream(interval, send_one):
+        # Random phase so thousands of clients do not send in lockstep
+        await asyncio.sleep(random.uniform(0, interval))
+        next_send = time.perf_counter()
+        while time.perf_counter() < deadline:
+            await send_one()
+            stats.sent += 1
+            next_send += interval
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+
+    sequence = 0
+    rep_count = 0
+
+    async def send_pose():
+        nonlocal probe, sequence
+        if probe is None:
+            probe = time.perf_counter()
+        sequence += 1
+        await websocket.send(pose_message(device_id, exercise_type, sequence, args.binary))
+
+    async def send_biometrics():
+        nonlocal rep_count
+        rep_count += 2 if rep_count % 10 == 9 else 1
+        await websocket.send(biometric_message(device_id, exercise_type, rep_count))
+
+    receiver = None
+    try:
+        await websocket.send(json.dumps({"type": "device_register", "deviceId": device_id, "exerciseType": exercise_type}))
+        await asyncio.wait_for(websocket.recv(), CONNECT_TIMEOUT)  # welcome
+        receiver = asyncio.create_task(receive())
+        streams = []
+        if args.pose_rate > 0:
+            streams.append(stream(1.0 / args.pose_rate, send_pose))
+        if args.bio_rate > 0:
+            streams.append(stream(1.0 / args.bio_rate, send_biometrics))
+        await asyncio.gather(*streams)
+        if websocket.open:
+            stats.sustained += 1
+    except (asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+        pass
+    finally:
+        if receiver is not None:
+            receiver.cancel()
+        await websocket.close()
+
+
+async def run_clients(url, first, count, args):
+    stats = ClientStats()
+    deadline = time.perf_counter() + args.ramp + args.duration
+    tasks = []
+    for number in range(first, first + count):
+        tasks.append(asyncio.create_task(simulated_client(url, number, args, stats, deadline)))
+        if args.ramp:
+            await asyncio.sleep(args.ramp / count)
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def process_main(url, first, count, args):
+    raise_fd_limit()
+    return asyncio.run(run_clients(url, first, count, args))
+
+
+def raise_fd_limit():
+    """Each client is a socket; lift the soft descriptor limit if allowed."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def summarize(stats, args, elapsed):
+    latencies = sorted(stats.latencies)
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "url": args.url,
+            "clients": args.clients,
+            "processes": args.processes,
+            "pose_rate": args.pose_rate,
+            "bio_rate": args.bio_rate,
+            "duration": args.duration,
+            "ramp": args.ramp,
+            "binary": args.binary,
+        },
+        "connections": {
+            "established": stats.connected,
+            "failed": stats.failed,
+            "sustained": stats.sustained,
+        },
+        "messages": {
+            "sent": stats.sent,
+            "received": stats.received,
+            "sent_per_sec": round(stats.sent / elapsed, 1),
+            "received_per_sec": round(stats.received / elapsed, 1),
+        },
+        "latency_ms": {
+            "samples": len(latencies),
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 0.50)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "p999": ms(percentile(latencies, 0.999)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+        "elapsed": round(elapsed, 2),
+    }
+
+
+def spawn_server(port, workers):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+               str(port), "--no-ssl", "--no-relay", f"--workers={workers}"]
+    server = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    time.sleep(3)  # let it bind (and the workers start)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the AR relay server")
+    parser.add_argument("--url", default="ws://127.0.0.1:8080")
+    parser.add_argument("--clients", type=int, default=500, help="simulated AR clients")
+    parser.add_argument("--processes", type=int, default=1, help="load generator processes")
+    parser.add_argument("--pose-rate", type=float, default=15.0, help="pose_data messages/s per client")
+    parser.add_argument("--bio-rate", type=float, default=1.0, help="biometric_data messages/s per client")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of streaming after the ramp")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which clients connect")
+    parser.add_argument("--binary", action="store_true", help="send pose_data as binary frames")
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--spawn-server", action="store_true", help="start server.py --no-ssl on the URL's port")
+    parser.add_argument("--server-workers", type=int, default=1, help="--workers for the spawned server")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn_server:
+        server = spawn_server(int(args.url.rsplit(":", 1)[1].split("/")[0]), args.server_workers)
+
+    shares = [args.clients // args.processes + (1 if i < args.clients % args.processes else 0)
+              for i in range(args.processes)]
+    started = time.perf_counter()
+    try:
+        if args.processes == 1:
+            stats = process_main(args.url, 0, args.clients, args)
+        else:
+            stats = ClientStats()
+            firsts = [sum(shares[:i]) for i in range(args.processes)]
+            with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+                for part in pool.starmap(process_main, [(args.url, f, n, args) for f, n in zip(firsts, shares)]):
+                    stats.merge(part)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    report = summarize(stats, args, time.perf_counter() - started)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    connections, messages, latency = report["connections"], report["messages"], report["latency_ms"]
+    print(f"Connections: {connections['established']} established, {connections['failed']} failed, "
+          f"{connections['sustained']} sustained")
+    print(f"Messages:    {messages['sent_per_sec']}/s sent, {messages['received_per_sec']}/s received")
+    print(f"Latency:     p50 {latency['p50']} ms, p99 {latency['p99']} ms, p999 {latency['p999']} ms "
+          f"({latency['samples']} samples)")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Outbound message codecs for the relay server.
+
+JSON goes out as text frames, using orjson when it is installed and the
+standard library otherwise. Clients that list "msgpack" in the codecs of
+their device_register message get binary MessagePack frames instead (when
+msgpack is installed).
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class JsonCodec:
+    name = "json"
+
+    if orjson is not None:
+        @staticmethod
+        def encode(message):
+            return orjson.dumps(message).decode()
+    else:
+        @staticmethod
+        def encode(message):
+            return json.dumps(message, separators=(",", ":"))
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    @staticmethod
+    def encode(message):
+        return msgpack.packb(message)
+
+
+JSON = JsonCodec()
+CODECS = {JSON.name: JSON}
+if msgpack is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec()
+
+
+def negotiate(requested):
+    """Picks the first codec from the client's preference list we support."""
+    for name in requested or ():
+        codec = CODECS.get(name)
+        if codec is not None:
+            return codec
+    return JSON
+
+
+class EncodeOnce:
+    """Encodes one message lazily, at most once per codec.
+
+    A broadcast creates one of these and every recipient shares the
+    resulting str/bytes, so serialization cost scales with unique messages
+    rather than recipients.
+    """
+
+    __slots__ = ("message", "encoded")
+
+    def __init__(self, message):
+        self.message = message
+        self.encoded = {}
+
+    def get(self, codec):
+        data = self.encoded.get(codec.name)
+        if data is None:
+            data = self.encoded[codec.name] = codec.encode(self.message)
+        return data
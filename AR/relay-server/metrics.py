@@ -0,0 +1,173 @@
+"""Prometheus metrics for the relay server.
+
+A small in-process registry (counters, gauges, histograms) rendered in the
+Prometheus text exposition format and served on GET /metrics from a plain
+asyncio HTTP listener, so scraping needs no extra dependencies. An event
+loop watchdog measures how late the loop wakes up, which is the first
+sign of saturation: every stalled callback delays all clients' feedback.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+DEFAULT_METRICS_PORT = 9477  # clear of node_exporter's 9100 and other common exporter defaults
+LAG_INTERVAL = 0.1  # seconds between event loop watchdog wakeups
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = defaultdict(float)  # label values -> total
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] += amount
+
+    def samples(self):
+        for label_values, value in self.values.items():
+            yield self.name + format_labels(self.labels, label_values), value
+
+
+class Gauge:
+    """Gauge that is either set directly or read from func at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, func=None):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, self.func() if self.func is not None else self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for label_values, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = format_labels(self.labels + ("le",), label_values + (bound,))
+                yield f"{self.name}_bucket{labels}", cumulative
+            labels = format_labels(self.labels, label_values)
+            yield f"{self.name}_count{labels}", cumulative
+            yield f"{self.name}_sum{labels}", series[-1]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def gauge(self, name, help, func=None):
+        return self.add(Gauge(name, help, func))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample, value in metric.samples():
+                lines.append(f"{sample} {value}")
+        return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(registry, port, host="0.0.0.0"):
+    """Serve registry.render() on GET /metrics; None if the port cannot be bound.
+
+    Runs as a background task nobody awaits, so a bind failure is reported
+    here rather than raised.
+    """
+
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass  # skip request headers
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                body = registry.render().encode()
+                status = b"200 OK"
+            else:
+                body = b"not found\n"
+                status = b"404 Not Found"
+            writer.write(b"HTTP/1.1 " + status + b"\r\n"
+                         b"Content-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                         b"Connection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    try:
+        server = await asyncio.start_server(handle, host, port)
+    except OSError as e:
+        print(f"⚠️  Metrics disabled: cannot listen on {host}:{port} ({e}); use --metrics-port=PORT")
+        return None
+    print(f"✓ Metrics on http://{host}:{port}/metrics")
+    return server
+
+
+async def watch_event_loop(histogram, gauge, interval=LAG_INTERVAL):
+    """Records how much later than requested the loop wakes up"""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        histogram.observe(lag)
+        gauge.set(lag)
+
+
+def install_uvloop():
+    """Switch asyncio to uvloop if it is installed; returns whether it was"""
+    try:
+        import uvloop
+    except ImportError:
+        print("⚠️  uvloop is not installed, using the default asyncio event loop")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
@@ -0,0 +1,62 @@
+"""Binary pose_data frames.
+
+A frame is a fixed 20-byte little-endian header followed by packed float32
+(x, y, score) triples, one per keypoint:
+
+    uint8   version        POSE_FRAME_VERSION
+    uint8   exercise id    index into EXERCISE_TYPES
+    uint16  device index   0 = the sending connection
+    uint32  sequence
+    float64 timestamp      ms since the epoch (JS Date.now())
+    uint16  keypoint count
+    2 bytes padding        keeps the keypoints 4-byte aligned
+
+Keypoints are exposed without copying, as a numpy view when numpy is
+available and a memoryview cast otherwise.
+"""
+import struct
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+POSE_FRAME_VERSION = 1
+POSE_HEADER = struct.Struct("<B B H I d H 2x")
+KEYPOINT_FIELDS = 3  # x, y, score
+KEYPOINT_SIZE = KEYPOINT_FIELDS * 4
+
+EXERCISE_TYPES = ("", "bicep-curls", "squats", "lateral-raises", "push-ups")
+
+
+def decode_pose_frame(frame):
+    """Decodes a binary frame into the same shape as a JSON pose_data message."""
+    view = memoryview(frame)
+    if len(view) < POSE_HEADER.size:
+        raise ValueError(f"pose frame too short ({len(view)} bytes)")
+    version, exercise_id, device_index, sequence, timestamp, count = POSE_HEADER.unpack_from(view)
+    if version != POSE_FRAME_VERSION:
+        raise ValueError(f"unsupported pose frame version {version}")
+    end = POSE_HEADER.size + count * KEYPOINT_SIZE
+    if len(view) < end:
+        raise ValueError(f"pose frame truncated ({len(view)} of {end} bytes)")
+
+    if np is not None:
+        keypoints = np.frombuffer(view, dtype="<f4", count=count * KEYPOINT_FIELDS,
+                                  offset=POSE_HEADER.size).reshape(count, KEYPOINT_FIELDS)
+    elif sys.byteorder == "little":
+        keypoints = view[POSE_HEADER.size:end].cast("f", (count, KEYPOINT_FIELDS))
+    else:
+        raise ValueError("binary pose frames need numpy on big-endian hosts")
+
+    return {
+        "type": "pose_data",
+        "deviceIndex": device_index,
+        "data": {
+            "exerciseType": EXERCISE_TYPES[exercise_id] if exercise_id < len(EXERCISE_TYPES) else "",
+            "sequence": sequence,
+            "timestamp": timestamp,
+            "keypoints": keypoints,
+        },
+    }
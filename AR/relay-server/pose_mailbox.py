@@ -0,0 +1,46 @@
+"""Latest-wins mailbox for high-rate pose frames.
+
+Pose frames only matter until the next one arrives, so instead of queueing
+them behind each other (and in front of control messages) each connection
+keeps a single slot that newer frames overwrite. A dedicated task drains
+the slot, so processing time never backs up the receive loop.
+"""
+import asyncio
+
+
+class LatestMailbox:
+    """Single-slot mailbox whose consumer task always sees the newest item."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.item = None
+        self.pending = False
+        self.ready = asyncio.Event()
+        self.received = 0
+        self.coalesced = 0  # items overwritten before they were processed
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, item):
+        self.received += 1
+        if self.pending:
+            self.coalesced += 1
+        self.item = item
+        self.pending = True
+        self.ready.set()
+
+    async def _run(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            item = self.item
+            self.item = None
+            self.pending = False
+            try:
+                await self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error processing pose data: {e}")
+
+    def close(self):
+        self.task.cancel()
@@ -0,0 +1,105 @@
+"""Push bridge from the relay node into the AR relay server.
+
+Subscribes to the Server-Sent Events stream of
+comms/relay_node/data_delivery_server.py and hands every biometrics sample
+and classifier result to callbacks as soon as it arrives. The stream is
+resumed with Last-Event-ID after a reconnect, so no biometrics produced
+while the link was down are lost (within the delivery server's history
+ring). Results from that time are not replayed: they would arrive as live
+feedback for reps the user has already finished.
+"""
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+DEFAULT_EVENTS_URL = "http://127.0.0.1:8081/events"
+RECONNECT_MIN_DELAY = 0.5  # seconds
+RECONNECT_MAX_DELAY = 10.0
+
+
+class RelayBridge:
+    """SSE client that dispatches relay events to on_biometrics/on_result."""
+
+    def __init__(self, url, on_biometrics, on_result):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.path = parts.path or "/events"
+        self.on_biometrics = on_biometrics
+        self.on_result = on_result
+        self.last_event_id = None
+        self.events = 0
+
+    async def run(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                print(f"⚠️  Relay bridge: cannot reach {self.host}:{self.port} ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+
+            try:
+                await self._subscribe(reader, writer)
+                delay = RECONNECT_MIN_DELAY
+                print(f"✓ Relay bridge connected to http://{self.host}:{self.port}{self.path}")
+                await self._read_events(reader)
+                print("⚠️  Relay bridge: stream closed")
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Relay bridge error: {e}")
+            finally:
+                writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _subscribe(self, reader, writer):
+        path = self.path + ("&" if "?" in self.path else "?") + "replay=biometrics"
+        request = f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nAccept: text/event-stream\r\n"
+        if self.last_event_id is not None:
+            request += f"Last-Event-ID: {self.last_event_id}\r\n"
+        writer.write((request + "\r\n").encode())
+        await writer.drain()
+
+        status = await reader.readline()
+        if b" 200 " not in status:
+            raise ValueError(f"unexpected response {status.strip()!r}")
+        while (await reader.readline()).strip():
+            pass  # skip response headers
+
+    async def _read_events(self, reader):
+        event_id = event = None
+        data = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            line = line.rstrip(b"\r\n")
+            if not line:
+                if data:
+                    self._dispatch(event_id, event, b"\n".join(data))
+                event_id = event = None
+                data = []
+            elif line.startswith(b"id:"):
+                event_id = int(line[3:])
+            elif line.startswith(b"event:"):
+                event = line[6:].strip().decode()
+            elif line.startswith(b"data:"):
+                data.append(line[5:].strip())
+            # lines starting with ':' are keepalive comments
+
+    def _dispatch(self, event_id, event, data):
+        if event_id is not None:
+            self.last_event_id = event_id
+        self.events += 1
+        payload = json.loads(data)
+        if event == "biometrics":
+            self.on_biometrics(payload)
+        elif event == "result":
+            self.on_result(payload)
+        elif event == "state":
+            # Initial snapshot: forward the biometrics but not the last
+            # result, which would be stale feedback.
+            if payload.get("biometrics"):
+                self.on_biometrics(payload["biometrics"])
@@ -0,0 +1,84 @@
+"""Per-connection outbound queues for the relay server.
+
+Each WebSocket gets a ClientSender: a bounded queue drained by its own
+writer task. Producers enqueue and return immediately, so a slow client
+only ever delays itself.
+"""
+import asyncio
+from collections import deque
+
+SEND_QUEUE_SIZE = 64  # messages buffered per client before shedding load
+
+# Message priorities. LOW messages (periodic metrics, pose feedback) are
+# superseded by the next one anyway and are dropped first on overflow; a
+# client that cannot even keep up with HIGH messages is disconnected.
+LOW = 0
+HIGH = 1
+
+OVERFLOW_CLOSE_CODE = 1013  # "try again later"
+
+
+class ClientSender:
+    """Bounded send queue plus writer task for one WebSocket."""
+
+    def __init__(self, websocket, maxsize=SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.queue = deque()  # (priority, message)
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.task = asyncio.create_task(self._writer())
+
+    def send(self, message, priority=LOW):
+        """Queues a message without awaiting; returns False if it was dropped."""
+        if self.closed:
+            return False
+        if len(self.queue) >= self.maxsize:
+            if priority == LOW:
+                self.dropped += 1
+                return False
+            for i, (queued_priority, _) in enumerate(self.queue):
+                if queued_priority == LOW:
+                    del self.queue[i]
+                    self.dropped += 1
+                    break
+            else:
+                print(f"Send queue overflow, disconnecting slow client {self.websocket.remote_address}")
+                self.close(OVERFLOW_CLOSE_CODE, "send queue overflow")
+                return False
+        self.queue.append((priority, message))
+        self.ready.set()
+        return True
+
+    async def _writer(self):
+        try:
+            while True:
+                if not self.queue:
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                _, message = self.queue.popleft()
+                await self.websocket.send(message)
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Connection went away; the receive loop handles cleanup.
+            print(f"Error sending to client: {e}")
+            self.closed = True
+
+    def close(self, code=1000, reason=""):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.task.cancel()
+        asyncio.create_task(self.websocket.close(code, reason))
+
+    def stop(self):
+        """Stops the writer after the connection has already closed."""
+        self.closed = True
+        self.queue.clear()
+        self.task.cancel()
@@ -6,16 +6,41 @@ import socket
 import websockets
 from websockets.server import WebSocketServerProtocol
 
+from message_codec import EncodeOnce, negotiate
+from metrics import DEFAULT_METRICS_PORT, MetricsRegistry, install_uvloop, serve_metrics, watch_event_loop
+from pose_frame import decode_pose_frame
+from pose_mailbox import LatestMailbox
+from relay_bridge import DEFAULT_EVENTS_URL, RelayBridge
+from send_queue import ClientSender, HIGH, LOW
+from session_registry import EVICTION_INTERVAL, SessionRegistry
+
+# Relay mode ids (see biometrics_receiver_server.py) of the exercise modes
+EXERCISE_BY_MODE = {
+    2: "lateral-raises",
+    3: "squats",
+    4: "bicep-curls",
+}
+DEMO_METRICS_INTERVAL = 5.0  # seconds between simulated metrics in demo mode
+
 class FitnessRelayServer:
-    def __init__(self):
-        self.connections = {}  # hdl -> device_id
-        self.device_connections = {}  # device_id -> hdl
-        self.device_index = {}  # index -> device_id (for easy command access)
-        self.device_counter = 0  # Counter for device indices
-        self.local_ip = self.get_local_ip()
-        
-        # Track workout state for dynamic metrics
-        self.device_workout_state = {}  # device_id -> {start_time, rep_count, is_active, base_heart_rate}
+    def __init__(self, relay_url=DEFAULT_EVENTS_URL, sessions=None, local_ip=None, metrics_port=None,
+                 demo_feedback=None):
+        # Per-connection state (sender, codec, workout, analytics), indexed
+        # by socket, device id and device index
+        self.sessions = sessions if sessions is not None else SessionRegistry()
+        self.cluster = None  # ClusterLink when running as a cluster worker
+        self.local_ip = local_ip or self.get_local_ip()
+        self.metrics_port = metrics_port
+        self.init_metrics()
+
+        # Relay bridge state
+        self.relay_url = relay_url
+        self.tracker_pairing = {}  # tracker index -> device_id
+        self.last_tracker_mode = {}  # tracker index -> relay mode id
+        self.active_tracker = 0
+        # Canned random feedback per pose frame and simulated metrics, for
+        # demos without the relay node; by default only when no relay is bridged
+        self.demo_feedback = relay_url is None if demo_feedback is None else demo_feedback
         
         self.feedback_templates = {
             "push-ups": [
@@ -97,24 +122,57 @@ class FitnessRelayServer:
             print(f"❌ Warning: Could not detect local IP: {e}")
             return "127.0.0.1"
 
+    def init_metrics(self):
+        sessions = self.sessions
+        self.metrics = metrics = MetricsRegistry()
+        metrics.gauge("relay_connected_clients", "Open WebSocket connections",
+                      lambda: len(sessions.by_socket))
+        metrics.gauge("relay_registered_devices", "Registered devices, connected or awaiting reconnect",
+                      lambda: len(sessions.by_device))
+        metrics.gauge("relay_sessions", "Sessions held by the registry", lambda: len(sessions))
+        metrics.gauge("relay_send_queue_depth", "Messages queued across all clients",
+                      lambda: sum(len(s.sender.queue) for s in sessions.by_socket.values()))
+        metrics.gauge("relay_send_queue_depth_max", "Deepest client send queue",
+                      lambda: max((len(s.sender.queue) for s in sessions.by_socket.values()), default=0))
+        self.messages_in = metrics.counter("relay_messages_received_total", "Inbound messages", ("type",))
+        self.messages_out = metrics.counter("relay_messages_sent_total", "Outbound messages queued", ("type",))
+        self.messages_dropped = metrics.counter("relay_messages_dropped_total",
+                                                "Outbound messages shed by a full send queue", ("type",))
+        self.handler_seconds = metrics.histogram("relay_handler_seconds", "Message handler processing time",
+                                                 ("type",))
+        self.loop_lag = metrics.histogram("relay_event_loop_lag_seconds", "Event loop wakeup delay")
+        self.loop_lag_last = metrics.gauge("relay_event_loop_lag_last_seconds", "Most recent event loop lag")
+
     async def on_connect(self, websocket: WebSocketServerProtocol):
         print("New client connected")
-        self.connections[websocket] = "unknown"
+        session = self.sessions.connect(websocket)
+        session.sender = ClientSender(websocket)
+        session.pose_mailbox = LatestMailbox(
+            lambda data: self.handle_pose_data(websocket, data))
 
     async def on_disconnect(self, websocket: WebSocketServerProtocol):
         print("Client disconnected")
-        device_id = self.connections.pop(websocket, "unknown")
-        if device_id != "unknown":
-            self.device_connections.pop(device_id, None)
-            # Remove from index
-            for idx, dev_id in list(self.device_index.items()):
-                if dev_id == device_id:
-                    del self.device_index[idx]
-                    break
-            print(f"Device {device_id} disconnected")
+        session = self.sessions.get(websocket)
+        if session is None:
+            return
+        session.sender.stop()
+        session.pose_mailbox.close()
+        self.sessions.disconnect(websocket)
+        if session.device_id is not None:
+            print(f"Device {session.device_id} disconnected")
+            if self.cluster and self.sessions.find(session.device_id) is session:
+                self.cluster.announce(session, "offline")
 
-    async def handle_message(self, websocket: WebSocketServerProtocol, message: str):
+    async def handle_message(self, websocket: WebSocketServerProtocol, message):
+        started = time.perf_counter()
+        message_type = "unparsed"
         try:
+            if isinstance(message, bytes):
+                # Binary frames are packed pose_data (see pose_frame.py)
+                message_type = "pose_frame"
+                self.sessions.get(websocket).pose_mailbox.put(decode_pose_frame(message))
+                return
+
             data = json.loads(message)
             message_type = data.get("type", "")
             device_id = data.get("deviceId", "")
@@ -125,25 +183,33 @@ class FitnessRelayServer:
             elif message_type == "biometric_data":
                 await self.handle_biometric_data(websocket, data)
             elif message_type == "pose_data":
-                await self.handle_pose_data(websocket, data)
+                # Coalesced to the newest frame and processed off the receive
+                # loop, so control messages never wait behind pose backlog.
+                self.sessions.get(websocket).pose_mailbox.put(data)
             elif message_type == "rep_detection":
                 await self.handle_rep_detection(websocket, data)
             else:
                 print(f"Unknown message type: {message_type}")
+                message_type = "unknown"
         except Exception as e:
             print(f"Error processing message: {e}")
+        finally:
+            self.messages_in.inc(message_type)
+            self.handler_seconds.observe(time.perf_counter() - started, message_type)
 
     async def handle_device_registration(self, websocket, data):
         device_id = data.get("deviceId", "")
         exercise_type = data.get("exerciseType", "")
         if device_id:
-            self.connections[websocket] = device_id
-            self.device_connections[device_id] = websocket
-            # Assign index to device
-            self.device_counter += 1
-            self.device_index[self.device_counter] = device_id
-            print(f"Device registered: {device_id} (Exercise: {exercise_type}) [Index: {self.device_counter}]")
-            await self.send_ai_feedback(websocket, exercise_type, "good", ["Welcome! Ready to start your workout."])
+            session = self.sessions.get(websocket)
+            session.codec = negotiate(data.get("codecs"))
+            session.exercise_type = exercise_type
+            resumed = self.sessions.register(session, device_id)
+            action = "reconnected" if resumed else "registered"
+            print(f"Device {action}: {device_id} (Exercise: {exercise_type}, Codec: {session.codec.name}) [Index: {session.index}]")
+            if self.cluster:
+                self.cluster.announce(session, "online")
+            self.send_ai_feedback(websocket, exercise_type, "good", ["Welcome! Ready to start your workout."], priority=HIGH)
 
     async def handle_biometric_data(self, websocket, data):
         biometric_data = data.get("data", {})
@@ -151,16 +217,22 @@ class FitnessRelayServer:
         rep_count = biometric_data.get("repCount", 0)
         exercise_type = biometric_data.get("exerciseType", "")
 
-        if heart_rate > 150:
-            await self.send_ai_feedback(websocket, exercise_type, "warning", ["Heart rate is high - consider taking a break"])
+        session = self.sessions.get(websocket)
+        valid_hr = session.hr_analytics.update(heart_rate, time.time(), session.workout_active)
+
+        if valid_hr and heart_rate > 150:
+            self.send_ai_feedback(websocket, exercise_type, "warning", ["Heart rate is high - consider taking a break"], priority=HIGH)
         elif rep_count > 0 and rep_count % 10 == 0:
-            await self.send_ai_feedback(websocket, exercise_type, "good", [f"Great progress! {rep_count} reps completed!"])
+            self.send_ai_feedback(websocket, exercise_type, "good", [f"Great progress! {rep_count} reps completed!"])
 
     async def handle_pose_data(self, websocket, data):
+        started = time.perf_counter()
         pose_data = data.get("data", {})
         exercise_type = pose_data.get("exerciseType", "")
-        await asyncio.sleep(0.05)
-        await self.generate_and_send_feedback(websocket, exercise_type)
+        if self.demo_feedback:
+            await asyncio.sleep(0.05)
+            self.generate_and_send_feedback(websocket, exercise_type)
+        self.handler_seconds.observe(time.perf_counter() - started, "pose_processing")
 
     async def handle_rep_detection(self, websocket, data):
         rep_data = data.get("data", {})
@@ -168,12 +240,12 @@ class FitnessRelayServer:
         exercise_type = rep_data.get("exerciseType", "")
         print(f"Rep detected: {rep_count} for {exercise_type}")
         if rep_count % 5 == 0:
-            await self.send_ai_feedback(websocket, exercise_type, "good", [
+            self.send_ai_feedback(websocket, exercise_type, "good", [
                 f"Excellent! {rep_count} reps completed!",
                 "Keep up the great work!"
-            ])
+            ], priority=HIGH)
 
-    async def generate_and_send_feedback(self, websocket, exercise_type):
+    def generate_and_send_feedback(self, websocket, exercise_type):
         feedback_index = random.randint(0, 6)
         confidence = random.uniform(0.7, 1.0)
         status = "good"
@@ -193,9 +265,38 @@ class FitnessRelayServer:
         safe_index = feedback_index % len(templates)
         feedback_msg = templates[safe_index]
         
-        await self.send_ai_feedback(websocket, exercise_type, status, [feedback_msg], confidence)
+        self.send_ai_feedback(websocket, exercise_type, status, [feedback_msg], confidence)
+
+    def send(self, websocket, message, priority=LOW):
+        """Queue a message on the client's sender; never waits on the network.
+
+        message may be a dict or an EncodeOnce shared between recipients.
+        """
+        session = self.sessions.get(websocket)
+        if session is None:
+            return False
+        if not isinstance(message, EncodeOnce):
+            message = EncodeOnce(message)
+        message_type = message.message.get("type", "")
+        if session.sender.send(message.get(session.codec), priority):
+            self.messages_out.inc(message_type)
+            return True
+        self.messages_dropped.inc(message_type)
+        return False
+
+    def broadcast(self, websockets, message, priority=LOW):
+        """Queue one message for many clients, encoding it once per codec"""
+        shared = EncodeOnce(message)
+        sent = 0
+        for websocket in websockets:
+            if self.send(websocket, shared, priority):
+                sent += 1
+        return sent
+
+    def send_ai_feedback(self, websocket, exercise_type, status, feedback, confidence=0.85, priority=LOW):
+        self.broadcast_ai_feedback([websocket], exercise_type, status, feedback, confidence, priority)
 
-    async def send_ai_feedback(self, websocket, exercise_type, status, feedback, confidence=0.85):
+    def broadcast_ai_feedback(self, websockets, exercise_type, status, feedback, confidence=0.85, priority=LOW):
         try:
             response = {
                 "type": "ai_feedback",
@@ -207,7 +308,7 @@ class FitnessRelayServer:
                     "feedback": feedback
                 }
             }
-            await websocket.send(json.dumps(response))
+            self.broadcast(websockets, response, priority)
         except Exception as e:
             print(f"Error sending AI feedback: {e}")
 
@@ -215,8 +316,12 @@ class FitnessRelayServer:
     # WORKOUT CONTROL COMMANDS - For testing and control
     # ============================================================================
     
-    async def send_system_command(self, websocket, action, **kwargs):
+    def send_system_command(self, websocket, action, **kwargs):
         """Send a system command to a device"""
+        self.broadcast_system_command([websocket], action, **kwargs)
+
+    def broadcast_system_command(self, websockets, action, **kwargs):
+        """Send the same system command to several devices, serialized once"""
         try:
             command = {
                 "type": "system_command",
@@ -225,114 +330,107 @@ class FitnessRelayServer:
                     **kwargs
                 }
             }
-            await websocket.send(json.dumps(command))
-            print(f"✓ Sent command: {action} {kwargs}")
+            sent = self.broadcast(websockets, command, HIGH)
+            if sent:
+                print(f"✓ Sent command: {action} {kwargs} to {sent} device(s)")
         except Exception as e:
             print(f"Error sending system command: {e}")
     
-    def resolve_device_id(self, identifier):
-        """Resolve device identifier (can be index, device_id, or 'all')"""
+    def resolve_device(self, identifier):
+        """Resolve device identifier (can be index, device_id, or 'all') to its session"""
         if identifier == "all":
             return "all"
         
         # Try as index number
         try:
             index = int(identifier)
-            if index in self.device_index:
-                return self.device_index[index]
-            else:
+            session = self.sessions.at_index(index)
+            if session is None:
                 print(f"❌ Device index {index} not found. Use 'list' to see devices.")
-                return None
+            return session
         except ValueError:
             # Not a number, treat as device_id
-            if identifier in self.device_connections:
-                return identifier
-            else:
+            session = self.sessions.find(identifier)
+            if session is None:
                 print(f"❌ Device {identifier} not found. Use 'list' to see devices.")
-                return None
+            return session
     
     async def select_exercise(self, device_identifier, exercise_type):
         """Select an exercise for a device or all devices"""
-        device_id = self.resolve_device_id(device_identifier)
-        if device_id is None:
+        target = self.resolve_device(device_identifier)
+        if target is None:
             return
             
-        if device_id == "all":
-            for dev_id, websocket in list(self.device_connections.items()):
-                if websocket.open:
-                    await self.send_system_command(websocket, "select_exercise", exerciseType=exercise_type)
+        if target == "all":
+            websockets = [session.websocket for session in self.sessions.connected()]
+            self.broadcast_system_command(websockets, "select_exercise", exerciseType=exercise_type)
             print(f"📋 Sent to ALL: Select exercise '{exercise_type}'")
+        elif target.connected:
+            self.send_system_command(target.websocket, "select_exercise", exerciseType=exercise_type)
+            print(f"📋 Sent to device: Select exercise '{exercise_type}'")
         else:
-            websocket = self.device_connections.get(device_id)
-            if websocket and websocket.open:
-                await self.send_system_command(websocket, "select_exercise", exerciseType=exercise_type)
-                print(f"📋 Sent to device: Select exercise '{exercise_type}'")
-            else:
-                print(f"❌ Device not found or not connected")
+            print(f"❌ Device not found or not connected")
     
     async def start_workout(self, device_identifier):
         """Start workout for a device or all devices"""
-        device_id = self.resolve_device_id(device_identifier)
-        if device_id is None:
+        target = self.resolve_device(device_identifier)
+        if target is None:
             return
             
-        if device_id == "all":
-            for dev_id, websocket in list(self.device_connections.items()):
-                if websocket.open:
-                    await self.send_system_command(websocket, "start_workout")
-                    # Activate workout state for dynamic metrics
-                    if dev_id in self.device_workout_state:
-                        self.device_workout_state[dev_id]['is_active'] = True
-                        self.device_workout_state[dev_id]['start_time'] = time.time()
-                        self.device_workout_state[dev_id]['rep_count'] = 0
-            print(f"▶️  Sent to ALL: Start workout (metrics now active)")
-        else:
-            websocket = self.device_connections.get(device_id)
-            if websocket and websocket.open:
-                await self.send_system_command(websocket, "start_workout")
-                # Activate workout state for dynamic metrics
-                if device_id in self.device_workout_state:
-                    self.device_workout_state[device_id]['is_active'] = True
-                    self.device_workout_state[device_id]['start_time'] = time.time()
-                    self.device_workout_state[device_id]['rep_count'] = 0
-                print(f"▶️  Sent to device: Start workout (metrics now active)")
-            else:
-                print(f"❌ Device not found or not connected")
+        sessions = self.sessions.connected() if target == "all" else [target]
+        sessions = [session for session in sessions if session.connected]
+        if not sessions:
+            print(f"❌ Device not found or not connected")
+            return
+        self.broadcast_system_command([session.websocket for session in sessions], "start_workout")
+        for session in sessions:
+            # Activate workout state for dynamic metrics
+            session.workout_active = True
+            session.workout_start = time.time()
+            session.rep_count = 0
+        recipient = "ALL" if target == "all" else "device"
+        print(f"▶️  Sent to {recipient}: Start workout (metrics now active)")
     
     async def stop_workout(self, device_identifier):
         """Stop workout for a device or all devices"""
-        device_id = self.resolve_device_id(device_identifier)
-        if device_id is None:
+        target = self.resolve_device(device_identifier)
+        if target is None:
             return
             
-        if device_id == "all":
-            for dev_id, websocket in list(self.device_connections.items()):
-                if websocket.open:
-                    await self.send_system_command(websocket, "stop_workout")
-                    # Deactivate workout state
-                    if dev_id in self.device_workout_state:
-                        self.device_workout_state[dev_id]['is_active'] = False
-                        final_reps = self.device_workout_state[dev_id]['rep_count']
-                        final_duration = int(time.time() - self.device_workout_state[dev_id]['start_time'])
-                        print(f"   📊 Final stats for {dev_id[:8]}... → Reps: {final_reps}, Duration: {final_duration}s")
-            print(f"⏹️  Sent to ALL: Stop workout (metrics now passive)")
-        else:
-            websocket = self.device_connections.get(device_id)
-            if websocket and websocket.open:
-                await self.send_system_command(websocket, "stop_workout")
-                # Deactivate workout state
-                if device_id in self.device_workout_state:
-                    self.device_workout_state[device_id]['is_active'] = False
-                    final_reps = self.device_workout_state[device_id]['rep_count']
-                    final_duration = int(time.time() - self.device_workout_state[device_id]['start_time'])
-                    print(f"   📊 Final stats → Reps: {final_reps}, Duration: {final_duration}s")
-                print(f"⏹️  Sent to device: Stop workout (metrics now passive)")
-            else:
-                print(f"❌ Device not found or not connected")
+        sessions = self.sessions.connected() if target == "all" else [target]
+        sessions = [session for session in sessions if session.connected]
+        if not sessions:
+            print(f"❌ Device not found or not connected")
+            return
+        self.broadcast_system_command([session.websocket for session in sessions], "stop_workout")
+        for session in sessions:
+            # Deactivate workout state
+            session.workout_active = False
+            final_duration = int(time.time() - session.workout_start)
+            print(f"   📊 Final stats for {session.device_id[:8]}... → Reps: {session.rep_count}, Duration: {final_duration}s")
+        recipient = "ALL" if target == "all" else "device"
+        print(f"⏹️  Sent to {recipient}: Stop workout (metrics now passive)")
     
+    def show_hr_stats(self, device_identifier):
+        """Print streaming heart-rate analytics for a device or all devices"""
+        target = self.resolve_device(device_identifier)
+        if target is None:
+            return
+        sessions = self.sessions.registered() if target == "all" else [target]
+        for session in sessions:
+            stats = session.hr_analytics.snapshot()
+            if stats['heartRate'] is None:
+                print(f"❤️  {session.device_id[:8]}... → no heart rate data yet")
+                continue
+            print(f"❤️  {session.device_id[:8]}... → HR: {stats['heartRate']} (zone {stats['zone']}) | "
+                  f"avg/min/max: {stats['rollingMean']}/{stats['rollingMin']}/{stats['rollingMax']} | "
+                  f"recovery: {stats['recoveryRate']} bpm/min, last HRR60: {stats['lastRecovery']}")
+            print(f"   Zone seconds: {stats['zoneSeconds']} | rejected readings: {stats['rejected']}")
+
     def list_devices(self):
-        """List all connected devices"""
-        if not self.device_connections:
+        """List all registered devices, including recently disconnected ones"""
+        sessions = self.sessions.registered()
+        if not sessions:
             print("\n📱 No devices connected")
             return []
         
@@ -340,104 +438,153 @@ class FitnessRelayServer:
         print("📱 CONNECTED DEVICES")
         print("=" * 70)
         device_list = []
-        
-        # Create reverse mapping for display
-        id_to_index = {device_id: idx for idx, device_id in self.device_index.items()}
-        
-        for device_id, websocket in self.device_connections.items():
-            status = "✓ Online" if websocket.open else "✗ Offline"
-            index = id_to_index.get(device_id, "?")
-            print(f"  [{index}] {device_id} - {status}")
-            device_list.append(device_id)
+        for session in sessions:
+            status = "✓ Online" if session.connected else "✗ Offline"
+            print(f"  [{session.index}] {session.device_id} - {status}")
+            device_list.append(session.device_id)
+        stats = self.sessions.stats()
         print("=" * 70)
+        print(f"🗂️  Sessions: {stats['sessions']} ({stats['connected']} connected, "
+              f"{stats['idle']} awaiting reconnect, {stats['evicted']} evicted)")
         print("💡 Tip: Use the index number [1], [2], etc. in commands")
         print("=" * 70 + "\n")
         return device_list
 
-    async def send_performance_metrics(self, websocket, device_id):
-        """Send dynamic performance metrics to device"""
+    async def evict_idle_sessions(self):
+        """Periodically drop state of devices that have not reconnected"""
+        while True:
+            await asyncio.sleep(EVICTION_INTERVAL)
+            evicted = self.sessions.evict_idle()
+            if evicted:
+                print(f"🧹 Evicted {len(evicted)} idle device session(s)")
+            if self.cluster:
+                for session in evicted:
+                    self.cluster.announce(session, "evicted")
+
+    def send_performance_metrics(self, session, heart_rate, rep_count):
+        """Send performance metrics built from real wearable data to a device"""
         try:
-            import random
-            
-            # Get or initialize workout state for this device
-            if device_id not in self.device_workout_state:
-                self.device_workout_state[device_id] = {
-                    'start_time': time.time(),
-                    'rep_count': 0,
-                    'base_heart_rate': random.randint(65, 75),
-                    'is_active': False
-                }
-            
-            state = self.device_workout_state[device_id]
-            
-            # Calculate dynamic workout duration
-            workout_duration = int(time.time() - state['start_time'])
-            
-            # Dynamic heart rate (increases over time if active, rests if not)
-            if state['is_active']:
-                # Heart rate increases with workout intensity
-                intensity = min(workout_duration / 60.0, 1.0)  # Max intensity after 1 min
-                heart_rate = int(state['base_heart_rate'] + (60 * intensity) + random.randint(-5, 5))
-                heart_rate = min(heart_rate, 180)  # Cap at 180
-                
-                # Rep count increases periodically (simulate reps)
-                if workout_duration % 8 == 0 and random.random() < 0.7:  # Rep every ~8 seconds
-                    state['rep_count'] += 1
-            else:
-                # Resting heart rate
-                heart_rate = state['base_heart_rate'] + random.randint(-3, 3)
-            
-            pulse = heart_rate + random.randint(-2, 2)
-            
+            session.rep_count = rep_count
+            workout_duration = int(time.time() - session.workout_start) if session.workout_active else 0
+
             # Calculate calories based on duration and reps
-            calories = int(workout_duration * 0.15 + state['rep_count'] * 1.2)
-            
+            calories = int(workout_duration * 0.15 + rep_count * 1.2)
+
             metrics = {
                 "heartRate": heart_rate,
-                "pulse": pulse,
-                "repCount": state['rep_count'],
+                "pulse": heart_rate,
+                "repCount": rep_count,
                 "workoutDuration": workout_duration,
                 "caloriesBurned": calories,
                 "timestamp": int(time.time() * 1000)
             }
-            
+
             message = {
                 "type": "performance_metrics",
                 "payload": metrics
             }
-            await websocket.send(json.dumps(message))
-            
-            # Log periodically (every 30 seconds)
-            if workout_duration % 30 == 0:
-                print(f"📊 Metrics sent to {device_id[:8]}... → HR: {heart_rate} | Reps: {state['rep_count']} | Duration: {workout_duration}s")
-                
+            self.send(session.websocket, message)
         except Exception as e:
             print(f"Error sending metrics: {e}")
-    
-    async def broadcast_periodic_data(self):
-        """Continuously send metrics and feedback to connected devices"""
-        print("📡 Starting continuous data broadcast...")
+
+    async def send_demo_metrics(self):
+        """Simulated wearable metrics for demo mode (no relay node)"""
         while True:
-            await asyncio.sleep(5)  # Send data every 5 seconds
-            
-            if len(self.device_connections) == 0:
-                continue
-                
-            for device_id, websocket in list(self.device_connections.items()):
-                if websocket.open:
-                    # Send performance metrics continuously (values change over time)
-                    await self.send_performance_metrics(websocket, device_id)
-                    
-                    # Send AI feedback occasionally (every 10 seconds)
-                    if not hasattr(self, '_last_feedback_time'):
-                        self._last_feedback_time = {}
-                    
-                    if device_id not in self._last_feedback_time or \
-                       time.time() - self._last_feedback_time[device_id] > 10:
-                        exercises = ["push-ups", "bicep-curls", "lateral-raises", "squats"]
-                        exercise = random.choice(exercises)
-                        await self.generate_and_send_feedback(websocket, exercise)
-                        self._last_feedback_time[device_id] = time.time()
+            await asyncio.sleep(DEMO_METRICS_INTERVAL)
+            for session in self.sessions.connected():
+                if session.workout_active:
+                    # Heart rate climbs to its peak over the first minute
+                    intensity = min((time.time() - session.workout_start) / 60.0, 1.0)
+                    heart_rate = min(int(70 + 60 * intensity) + random.randint(-5, 5), 180)
+                    rep_count = session.rep_count + (random.random() < 0.6)
+                else:
+                    heart_rate = 70 + random.randint(-3, 3)
+                    rep_count = session.rep_count
+                self.send_performance_metrics(session, heart_rate, rep_count)
+
+    # ============================================================================
+    # RELAY BRIDGE - real wearable and classifier data from the relay node
+    # ============================================================================
+
+    def pair_tracker(self, device_identifier, tracker):
+        """Route a wearable (tracker index from the BLE hub) to an AR device"""
+        target = self.resolve_device(device_identifier)
+        if target is None or target == "all":
+            print("❌ Pair one device at a time")
+            return
+        self.tracker_pairing[int(tracker)] = target.device_id
+        print(f"🔗 Tracker {tracker} → device {target.device_id[:8]}...")
+
+    def tracker_targets(self, tracker, online=None):
+        """AR devices that should receive data from a tracker.
+
+        Explicit pairing wins, then the AR device with the same index; with a
+        single AR device connected everything goes to it. online is the
+        cluster-wide device count when running as a worker.
+        """
+        device_id = self.tracker_pairing.get(tracker)
+        if device_id is not None:
+            session = self.sessions.find(device_id)
+        else:
+            session = self.sessions.at_index(tracker)
+            if session is None:
+                connected = self.sessions.connected()
+                if len(connected) == 1 and online in (None, 1):
+                    session = connected[0]
+        return [session] if session is not None and session.connected else []
+
+    def on_relay_biometrics(self, biometrics, online=None):
+        tracker = biometrics.get("device", 0)
+        heart_rate = biometrics.get("hr", 0)
+        rep_count = biometrics.get("reps", 0)
+        self.last_tracker_mode[tracker] = biometrics.get("mode")
+        if biometrics.get("mode") in EXERCISE_BY_MODE:
+            # The classifier works on whichever tracker is exercising
+            self.active_tracker = tracker
+        for session in self.tracker_targets(tracker, online):
+            session.hr_analytics.update(heart_rate, time.time(), session.workout_active)
+            self.send_performance_metrics(session, heart_rate, rep_count)
+
+    def on_relay_result(self, result, online=None):
+        targets = self.tracker_targets(self.active_tracker, online)
+        if not targets and online is None:
+            # No owner for the result: everyone connected gets it. In a
+            # cluster the hub decides that and sends online=None to all.
+            targets = self.sessions.connected()
+        tracker_mode = self.last_tracker_mode.get(self.active_tracker)
+        exercise_type = EXERCISE_BY_MODE.get(tracker_mode, "")
+        templates = self.feedback_templates.get(exercise_type, ["Keep up the good work!"])
+        if result.get("correct"):
+            status, feedback = "good", templates[0]
+        else:
+            status, feedback = "warning", templates[-1]
+        self.broadcast_ai_feedback([session.websocket for session in targets], exercise_type, status, [feedback], confidence=1.0)
+
+    def start_background_tasks(self):
+        self.eviction_task = asyncio.create_task(self.evict_idle_sessions())
+        self.lag_watchdog_task = asyncio.create_task(watch_event_loop(self.loop_lag, self.loop_lag_last))
+        if self.metrics_port:
+            self.metrics_task = asyncio.create_task(serve_metrics(self.metrics, self.metrics_port))
+        if self.relay_url:
+            bridge = RelayBridge(self.relay_url, self.on_relay_biometrics, self.on_relay_result)
+            self.relay_bridge_task = asyncio.create_task(bridge.run())
+        if self.demo_feedback:
+            self.demo_metrics_task = asyncio.create_task(self.send_demo_metrics())
+
+    async def execute_command(self, action, args):
+        """Run one console command (see run_console) against this server"""
+        if action == "list":
+            self.list_devices()
+        elif action == "select":
+            await self.select_exercise(args[0], args[1])
+        elif action == "start":
+            await self.start_workout(args[0])
+        elif action == "stop":
+            await self.stop_workout(args[0])
+        elif action == "stats":
+            self.show_hr_stats(args[0])
+        elif action == "pair":
+            self.pair_tracker(args[0], args[1])
 
     async def handler(self, websocket, path):
         await self.on_connect(websocket)
@@ -447,7 +594,9 @@ class FitnessRelayServer:
         finally:
             await self.on_disconnect(websocket)
 
-    async def run(self, port=8080, use_ssl=True):
+    async def run(self, port=8080, use_ssl=True, sock=None, banner=True):
+        """Serve forever; cluster workers pass their own SO_REUSEPORT socket"""
+        listen = {"sock": sock} if sock is not None else {"host": "0.0.0.0", "port": port}
         if use_ssl:
             import ssl
             import pathlib
@@ -473,51 +622,42 @@ class FitnessRelayServer:
             ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
             ssl_context.load_cert_chain(certfile=str(cert_file), keyfile=str(key_file))
             
-            print("=" * 70)
-            print(f"🚀 Fitness Relay Server (WSS - Secure)")
-            print("=" * 70)
-            print(f"✓ Server started on wss://0.0.0.0:{port}")
-            print(f"✓ Using SSL certificates from: {ssl_dir}")
-            print(f"\n📡 SERVER IP ADDRESS: {self.local_ip}")
-            print("\n🔗 Connection URL for AR app:")
-            print(f"   wss://{self.local_ip}:{port}")
-            print("\n💡 Configure AR app with this URL in Relay Settings")
-            print("=" * 70)
-            print("⏳ Waiting for connections...")
-            print("Press Ctrl+C to stop\n")
-            
-            async with websockets.serve(self.handler, "0.0.0.0", port, ssl=ssl_context):
-                asyncio.create_task(self.broadcast_periodic_data())
+            if banner:
+                self.print_banner(port, use_ssl, ssl_dir)
+            async with websockets.serve(self.handler, ssl=ssl_context, **listen):
+                self.start_background_tasks()
                 await asyncio.Future()  # Run forever
         else:
-            print("=" * 70)
-            print(f"🚀 Fitness Relay Server (WS - Non-Secure)")
-            print("=" * 70)
-            print(f"✓ Server started on ws://0.0.0.0:{port}")
-            print(f"\n📡 SERVER IP ADDRESS: {self.local_ip}")
-            print("\n🔗 Connection URL for AR app:")
-            print(f"   ws://{self.local_ip}:{port}")
-            print("\n💡 Configure AR app with this URL in Relay Settings")
-            print("=" * 70)
-            print("⏳ Waiting for connections...")
-            print("Press Ctrl+C to stop\n")
-            async with websockets.serve(self.handler, "0.0.0.0", port):
-                asyncio.create_task(self.broadcast_periodic_data())
+            if banner:
+                self.print_banner(port, use_ssl)
+            async with websockets.serve(self.handler, **listen):
+                self.start_background_tasks()
                 await asyncio.Future()  # Run forever
 
-async def run_server_with_commands(server, port, use_ssl):
-    """Run server with interactive command interface"""
-    import threading
-    
-    # Get the event loop
-    loop = asyncio.get_event_loop()
-    
-    # Start server in background
-    server_task = asyncio.create_task(server.run(port, use_ssl))
-    
-    # Wait a bit for server to start
-    await asyncio.sleep(2)
-    
+    def print_banner(self, port, use_ssl, ssl_dir=None):
+        scheme = "wss" if use_ssl else "ws"
+        print("=" * 70)
+        if use_ssl:
+            print(f"🚀 Fitness Relay Server (WSS - Secure)")
+        else:
+            print(f"🚀 Fitness Relay Server (WS - Non-Secure)")
+        print("=" * 70)
+        print(f"✓ Server started on {scheme}://0.0.0.0:{port}")
+        if ssl_dir is not None:
+            print(f"✓ Using SSL certificates from: {ssl_dir}")
+        print(f"\n📡 SERVER IP ADDRESS: {self.local_ip}")
+        print("\n🔗 Connection URL for AR app:")
+        print(f"   {scheme}://{self.local_ip}:{port}")
+        print("\n💡 Configure AR app with this URL in Relay Settings")
+        print("=" * 70)
+        print("⏳ Waiting for connections...")
+        print("Press Ctrl+C to stop\n")
+
+# Console commands and the number of arguments each needs
+CONSOLE_COMMANDS = {"list": 0, "select": 2, "start": 1, "stop": 1, "stats": 1, "pair": 2}
+
+
+def print_command_intro():
     print("\n" + "=" * 70)
     print("💬 INTERACTIVE COMMAND MODE")
     print("=" * 70)
@@ -526,13 +666,44 @@ async def run_server_with_commands(server, port, use_ssl):
     print("  select <id/all> <exercise>    - Select exercise (use device index, e.g., '1')")
     print("  start <id/all>                - Start workout (use device index, e.g., '1')")
     print("  stop <id/all>                 - Stop workout (use device index, e.g., '1')")
+    print("  stats <id/all>                - Show heart-rate analytics")
+    print("  pair <id> <tracker>           - Route a wearable's data to a device")
     print("  help                          - Show this help")
     print("  quit                          - Stop server")
     print("\n💡 Tip: Use 'list' to see device indices, then use numbers in commands!")
     print("=" * 70 + "\n")
-    
-    # Command loop
-    def command_loop(event_loop):
+
+
+def print_command_help():
+    print("\nAvailable commands:")
+    print("  list                        - List all connected devices with indices")
+    print("  select <id/all> <exercise>  - Select exercise")
+    print("    Exercises: bicep-curls, lateral-raises, squats, other")
+    print("    <id> can be: device index (1, 2, 3...), 'all', or full device_id")
+    print("  start <id/all>              - Start workout")
+    print("  stop <id/all>               - Stop workout")
+    print("  stats <id/all>              - Show heart-rate zones, rolling stats and recovery")
+    print("  pair <id> <tracker>         - Send wearable <tracker>'s data to device <id>")
+    print("  help                        - Show this help")
+    print("  quit                        - Stop server")
+    print("\nExamples (using device indices):")
+    print("  list")
+    print("  select 1 bicep-curls    # Select for device [1]")
+    print("  select all squats       # Select for all devices")
+    print("  start 1                 # Start for device [1]")
+    print("  start all               # Start for all devices")
+    print("  stop 1                  # Stop for device [1]\n")
+
+
+def start_console(event_loop, dispatch):
+    """Read commands on a background thread.
+
+    dispatch(action, args) is called on the event loop for every valid
+    command, so it may touch server state directly.
+    """
+    import threading
+
+    def command_loop():
         while True:
             try:
                 cmd = input("Command> ").strip()
@@ -541,67 +712,55 @@ async def run_server_with_commands(server, port, use_ssl):
                     
                 parts = cmd.split()
                 action = parts[0].lower()
+                args = parts[1:]
                 
                 if action == "quit":
                     print("\nStopping server...")
                     event_loop.call_soon_threadsafe(event_loop.stop)
                     break
-                elif action == "list":
-                    server.list_devices()
-                elif action == "select" and len(parts) >= 3:
-                    device_id = parts[1]
-                    exercise = parts[2]
-                    asyncio.run_coroutine_threadsafe(
-                        server.select_exercise(device_id, exercise),
-                        event_loop
-                    )
-                elif action == "start" and len(parts) >= 2:
-                    device_id = parts[1]
-                    asyncio.run_coroutine_threadsafe(
-                        server.start_workout(device_id),
-                        event_loop
-                    )
-                elif action == "stop" and len(parts) >= 2:
-                    device_id = parts[1]
-                    asyncio.run_coroutine_threadsafe(
-                        server.stop_workout(device_id),
-                        event_loop
-                    )
                 elif action == "help":
-                    print("\nAvailable commands:")
-                    print("  list                        - List all connected devices with indices")
-                    print("  select <id/all> <exercise>  - Select exercise")
-                    print("    Exercises: bicep-curls, lateral-raises, squats, other")
-                    print("    <id> can be: device index (1, 2, 3...), 'all', or full device_id")
-                    print("  start <id/all>              - Start workout")
-                    print("  stop <id/all>               - Stop workout")
-                    print("  help                        - Show this help")
-                    print("  quit                        - Stop server")
-                    print("\nExamples (using device indices):")
-                    print("  list")
-                    print("  select 1 bicep-curls    # Select for device [1]")
-                    print("  select all squats       # Select for all devices")
-                    print("  start 1                 # Start for device [1]")
-                    print("  start all               # Start for all devices")
-                    print("  stop 1                  # Stop for device [1]\n")
+                    print_command_help()
+                elif (action in CONSOLE_COMMANDS and len(args) >= CONSOLE_COMMANDS[action]
+                      and (action != "pair" or args[1].isdigit())):
+                    event_loop.call_soon_threadsafe(dispatch, action, args)
                 else:
                     print("❌ Invalid command. Type 'help' for available commands.")
             except EOFError:
                 break
             except Exception as e:
                 print(f"❌ Error: {e}")
-    
-    # Run command loop in a separate thread
-    cmd_thread = threading.Thread(target=command_loop, args=(loop,), daemon=True)
+
+    cmd_thread = threading.Thread(target=command_loop, daemon=True)
     cmd_thread.start()
+    return cmd_thread
+
+
+async def run_server_with_commands(server, port, use_ssl):
+    """Run server with interactive command interface"""
+    loop = asyncio.get_running_loop()
+    
+    # Start server in background
+    server_task = asyncio.create_task(server.run(port, use_ssl))
+    
+    # Wait a bit for server to start
+    await asyncio.sleep(2)
+    
+    print_command_intro()
+    start_console(loop, lambda action, args: asyncio.ensure_future(server.execute_command(action, args)))
     
     # Wait for server task
     await server_task
 
 if __name__ == "__main__":
     import sys
+    import cluster
     port = 8080
     use_ssl = True  # Use SSL by default
+    relay_url = DEFAULT_EVENTS_URL
+    workers = 1
+    metrics_port = DEFAULT_METRICS_PORT
+    use_uvloop = False
+    demo_feedback = None
     
     # Parse command line arguments
     for arg in sys.argv[1:]:
@@ -611,21 +770,51 @@ if __name__ == "__main__":
             use_ssl = False
         elif arg == '--ssl':
             use_ssl = True
+        elif arg.startswith('--relay='):
+            relay_url = arg.split('=', 1)[1]
+        elif arg == '--no-relay':
+            relay_url = None
+        elif arg.startswith('--workers='):
+            workers = max(1, int(arg.split('=', 1)[1]))
+        elif arg.startswith('--metrics-port='):
+            metrics_port = int(arg.split('=', 1)[1])
+        elif arg == '--uvloop':
+            use_uvloop = True
+        elif arg == '--demo-feedback':
+            demo_feedback = True
         elif arg in ['--help', '-h']:
-            print("\nUsage: python server.py [PORT] [--ssl|--no-ssl]")
+            print("\nUsage: python server.py [PORT] [--ssl|--no-ssl] [--relay=URL|--no-relay] [--workers=N]")
+            print("                      [--metrics-port=PORT] [--uvloop] [--demo-feedback]")
             print("\nOptions:")
             print("  PORT        Port number (default: 8080)")
             print("  --ssl       Enable SSL/WSS (default)")
             print("  --no-ssl    Disable SSL, use plain WS")
+            print(f"  --relay=URL Relay node event stream (default: {DEFAULT_EVENTS_URL})")
+            print("  --no-relay  Do not bridge wearable/classifier data from the relay node")
+            print("  --workers=N Serve from N processes sharing the port (Linux/macOS)")
+            print(f"  --metrics-port=PORT  Prometheus /metrics port, 0 to disable (default: {DEFAULT_METRICS_PORT});")
+            print("              worker N of a cluster uses PORT+N")
+            print("  --uvloop    Run on uvloop if it is installed")
+            print("  --demo-feedback  Answer pose data with random canned feedback and send")
+            print("              simulated metrics (default with --no-relay)")
             print("\nExamples:")
             print("  python server.py              # Run on port 8080 with SSL")
             print("  python server.py 9000         # Run on port 9000 with SSL")
             print("  python server.py --no-ssl     # Run on port 8080 without SSL")
-            print("  python server.py 9000 --no-ssl # Run on port 9000 without SSL\n")
+            print("  python server.py 9000 --no-ssl # Run on port 9000 without SSL")
+            print("  python server.py --workers=4  # Spread clients over 4 processes\n")
             exit(0)
     
-    server = FitnessRelayServer()
+    if use_uvloop:
+        install_uvloop()
+    server = FitnessRelayServer(relay_url, metrics_port=metrics_port, demo_feedback=demo_feedback)
+    if workers > 1 and not cluster.supported():
+        print("⚠️  --workers needs SO_REUSEPORT and Unix sockets; running a single process")
+        workers = 1
     try:
-        asyncio.run(run_server_with_commands(server, port, use_ssl))
+        if workers > 1:
+            asyncio.run(cluster.run_cluster(server, workers, port, use_ssl, use_uvloop))
+        else:
+            asyncio.run(run_server_with_commands(server, port, use_ssl))
     except KeyboardInterrupt:
         print("\nServer stopped.")
@@ -0,0 +1,145 @@
+"""Device session registry for the relay server.
+
+One DeviceSession per connection holds everything the server knows about
+a client: its sender, codec, pose mailbox, workout state and heart-rate
+analytics. The registry indexes sessions by socket, device id and index,
+all O(1). Disconnected sessions are kept for SESSION_TTL so a phone that
+reconnects resumes its index and workout; after that they are evicted and
+memory no longer grows with every device ever seen.
+"""
+import time
+from collections import OrderedDict
+
+from hr_analytics import HeartRateAnalytics
+from message_codec import JSON
+
+SESSION_TTL = 300.0  # seconds a disconnected device's state is kept
+EVICTION_INTERVAL = 30.0  # seconds between eviction sweeps
+
+
+class DeviceSession:
+    __slots__ = (
+        "websocket", "device_id", "index", "exercise_type",
+        "sender", "codec", "pose_mailbox", "hr_analytics",
+        "workout_active", "workout_start", "rep_count",
+        "last_seen",
+    )
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.device_id = None
+        self.index = None
+        self.exercise_type = ""
+        self.sender = None
+        self.codec = JSON
+        self.pose_mailbox = None
+        self.hr_analytics = HeartRateAnalytics()
+        self.workout_active = False
+        self.workout_start = time.time()
+        self.rep_count = 0
+        self.last_seen = time.monotonic()
+
+    @property
+    def connected(self):
+        return self.websocket is not None and self.websocket.open
+
+    def adopt(self, previous):
+        """Carries a reconnecting device's state over from its old session."""
+        self.index = previous.index
+        self.hr_analytics = previous.hr_analytics
+        self.workout_active = previous.workout_active
+        self.workout_start = previous.workout_start
+        self.rep_count = previous.rep_count
+
+
+class SessionRegistry:
+    def __init__(self, ttl=SESSION_TTL, first_index=1, index_stride=1):
+        self.ttl = ttl
+        self.by_socket = {}  # websocket -> DeviceSession
+        self.by_device = {}  # device_id -> DeviceSession
+        self.by_index = {}  # index -> DeviceSession
+        self.idle = OrderedDict()  # device_id -> disconnected session, oldest first
+        # Indices are first_index, first_index + stride, ... so that cluster
+        # workers hand out disjoint ranges (see cluster.py).
+        self.next_index = first_index
+        self.index_stride = index_stride
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.by_socket) + len(self.idle)
+
+    def connect(self, websocket):
+        session = DeviceSession(websocket)
+        self.by_socket[websocket] = session
+        return session
+
+    def register(self, session, device_id):
+        """Binds a connection to a device id; returns True for a reconnect."""
+        previous = self.by_device.get(device_id)
+        resumed = previous is not None and previous is not session
+        if resumed:
+            self.idle.pop(device_id, None)
+            session.adopt(previous)
+        elif session.index is None:
+            session.index = self.next_index
+            self.next_index += self.index_stride
+        session.device_id = device_id
+        self.by_device[device_id] = session
+        self.by_index[session.index] = session
+        return resumed
+
+    def disconnect(self, websocket):
+        session = self.by_socket.pop(websocket, None)
+        if session is None:
+            return None
+        session.websocket = None
+        session.sender = None
+        session.pose_mailbox = None
+        session.last_seen = time.monotonic()
+        # Only keep state if this connection still owns the device id; a
+        # newer connection may already have taken it over.
+        if session.device_id is not None and self.by_device.get(session.device_id) is session:
+            self.idle[session.device_id] = session
+        return session
+
+    def evict_idle(self, now=None):
+        """Drops disconnected sessions older than the TTL; returns them."""
+        now = time.monotonic() if now is None else now
+        evicted = []
+        while self.idle:
+            device_id, session = next(iter(self.idle.items()))
+            if now - session.last_seen < self.ttl:
+                break
+            del self.idle[device_id]
+            del self.by_device[device_id]
+            if self.by_index.get(session.index) is session:
+                del self.by_index[session.index]
+            evicted.append(session)
+        self.evicted += len(evicted)
+        return evicted
+
+    def get(self, websocket):
+        return self.by_socket.get(websocket)
+
+    def find(self, device_id):
+        return self.by_device.get(device_id)
+
+    def at_index(self, index):
+        return self.by_index.get(index)
+
+    def registered(self):
+        """Registered sessions, connected or idle, in index order."""
+        return sorted(self.by_device.values(), key=lambda session: session.index)
+
+    def connected(self):
+        """Registered sessions with an open connection."""
+        return [session for session in self.by_device.values() if session.connected]
+
+    def stats(self):
+        return {
+            "sessions": len(self),
+            "connected": len(self.by_socket),
+            "registered": len(self.by_device),
+            "idle": len(self.idle),
+            "evicted": self.evicted,
+        }
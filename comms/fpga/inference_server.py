@@ -1,8 +1,14 @@
 from pynq import allocate, Overlay
 import numpy as np
-import struct
 import socket
+import sys
 import time
+from pathlib import Path
+
+# protocol.py lives in the relay node; copy it next to this file on a board
+# without the full checkout.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "relay_node"))
+import protocol
 
 print("loading bitstream")
 overlay = Overlay("nn.bit")
@@ -13,11 +19,11 @@ print("setting auto restart and allocating buffers")
 nn.register_map.CTRL.AUTO_RESTART = 1
 nn.register_map.CTRL.AP_START = 1
 
-input_buffer = allocate(shape=(59,), dtype=np.float32)
+input_buffer = allocate(shape=(protocol.FEATURE_COUNT,), dtype=np.float32)
 output_buffer = allocate(shape=(1,), dtype=np.float32)
 
-def inference(data: list):
-    input_buffer[:] = np.array(data, dtype=np.float32)
+def inference(features):
+    input_buffer[:] = features
     dma.sendchannel.transfer(input_buffer)
     dma.recvchannel.transfer(output_buffer)
     dma.sendchannel.wait()
@@ -25,9 +31,26 @@ def inference(data: list):
     correct_float = output_buffer[0]
     return correct_float
 
-def unpack_59_floats(data: bytes):
-    print(len(data))
-    return list(struct.unpack('<' + 'f' * 59, data))
+def recv_exact(conn, size, data=b""):
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def handle(conn):
+    """Answers one feature vector (rpc_client.cpp) with its float32 prediction"""
+    data = recv_exact(conn, protocol.FEATURES_FMT.size)
+    if len(data) != protocol.FEATURES_FMT.size:
+        print("IGNORED:", len(data), "bytes")
+        return
+
+    start = time.time()
+    prediction = inference(protocol.decode_features(data)[0])
+    print(time.time()-start)
+    print("PREDICTION:", prediction)
+    conn.sendall(protocol.PREDICTION_FMT.pack(prediction))
 
 def main():
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -36,15 +59,12 @@ def main():
     print("Listening on localhost:2001")
     while (True):
         conn, addr = s.accept()
-        data = conn.recv(236)
-        result = unpack_59_floats(data)
-        print("INPUT:", result)
-        start = time.time()
-        prediction = inference(result)
-        print(time.time()-start)
-        print("PREDICTION:", prediction)
-        bytes_sent = conn.send(prediction)
-        print("REPLIED:", bytes_sent, "bytes")
+        try:
+            handle(conn)
+        except OSError as e:
+            print("ERROR:", e)
+        finally:
+            conn.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,200 @@
+"""Offline scoring of recorded workout videos.
+
+Headless counterpart of run.py: no camera, no relay, no pacing. Decoder
+threads read the videos (OpenCV releases the GIL while decoding), the
+pose model runs on batches of frames, and features and classifier outputs
+are computed for a whole batch at once. Every frame gets one row:
+
+    video, frame, timestamp_ms, detected, keypoints (17 x [x, y, conf]),
+    features (59), prediction (sigmoid of the classifier output)
+
+Rows are written as Parquet if pyarrow is installed, otherwise as a
+NumPy .npz with one array per column. Frames without a detection keep
+NaN keypoints, features and prediction.
+
+    python batch_score.py --exercise 1 --output squats.parquet sessions/*.mp4
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+import torch
+from ultralytics import YOLO
+
+from NN import NN
+from preprocessingv2 import detect_keypoints_batch, pose_features_batch
+
+POSE_MODEL_PATH = "models/yolo11s-pose.pt"
+NN_MODEL_PATH = "model_epoch_74.pt"
+BATCH_SIZE = 32  # frames per pose model call
+QUEUE_BATCHES = 4  # decoded batches buffered ahead of inference
+KEYPOINT_COUNT = 17
+FEATURE_COUNT = 59
+
+_DONE = object()
+
+
+def decode_videos(paths, frames_out, stride, decoders):
+    """Decodes paths on decoder threads into frames_out as (video, frame, ms, image)"""
+    pending = queue.Queue()
+    for video, path in enumerate(paths):
+        pending.put((video, path))
+
+    def decode(video, path):
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            print(f"❌ Cannot open video {path}")
+            return
+        try:
+            index = 0
+            while cap.grab():
+                if index % stride == 0:
+                    ret, image = cap.retrieve()
+                    if not ret:
+                        print(f"⚠️  {path}: decoding stopped at frame {index}")
+                        break
+                    frames_out.put((video, index, cap.get(cv2.CAP_PROP_POS_MSEC), image))
+                index += 1
+        finally:
+            cap.release()
+
+    def worker():
+        # The sentinel must go out however the worker ends, or batches()
+        # waits for it forever
+        try:
+            while True:
+                try:
+                    video, path = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    decode(video, path)
+                except cv2.error as e:
+                    print(f"❌ Failed decoding {path}: {e}")
+        finally:
+            frames_out.put(_DONE)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(decoders)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def batches(frames_in, decoders, batch_size):
+    """Groups decoded frames into lists of batch_size until all decoders finish"""
+    batch = []
+    finished = 0
+    while finished < decoders:
+        item = frames_in.get()
+        if item is _DONE:
+            finished += 1
+            continue
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def score_batch(batch, exercise, pose_model, nn_model):
+    keypoints = np.full((len(batch), KEYPOINT_COUNT, 3), np.nan, dtype=np.float32)
+    features = np.full((len(batch), FEATURE_COUNT), np.nan, dtype=np.float32)
+    predictions = np.full(len(batch), np.nan, dtype=np.float32)
+
+    detections = detect_keypoints_batch([image for _, _, _, image in batch], pose_model)
+    detected = np.array([kp is not None for kp in detections])
+    if detected.any():
+        keypoints[detected] = np.stack([kp for kp in detections if kp is not None])
+        features[detected] = pose_features_batch(keypoints[detected, :, :2], exercise)
+        with torch.inference_mode():
+            logits = nn_model(torch.from_numpy(features[detected]))
+            predictions[detected] = torch.sigmoid(logits).squeeze(1).numpy()
+    return detected, keypoints, features, predictions
+
+
+def write_columns(path, columns):
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            path = os.path.splitext(path)[0] + ".npz"
+            print(f"⚠️  pyarrow is not installed, writing {path} instead")
+        else:
+            table = pa.table({
+                name: pa.FixedSizeListArray.from_arrays(values.reshape(-1), values[0].size)
+                if values.ndim > 1 else values
+                for name, values in columns.items()
+            })
+            pq.write_table(table, path)
+            return path
+    np.savez(path, **columns)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score recorded workout videos offline")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--exercise", type=int, default=0, choices=(0, 1, 2),
+                        help="0=bicep curls, 1=squats, 2=lateral raise")
+    parser.add_argument("--output", default="scores.parquet", help=".parquet (needs pyarrow) or .npz")
+    parser.add_argument("--pose-model", default=POSE_MODEL_PATH)
+    parser.add_argument("--nn-model", default=NN_MODEL_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--decoders", type=int, default=min(4, os.cpu_count() or 1),
+                        help="video decoder threads")
+    parser.add_argument("--stride", type=int, default=1, help="score every Nth frame")
+    args = parser.parse_args()
+
+    pose_model = YOLO(args.pose_model)
+    nn_model = NN()
+    nn_model.load_state_dict(torch.load(args.nn_model, weights_only=True))
+    nn_model.eval()
+
+    decoders = min(args.decoders, len(args.videos))
+    frames = queue.Queue(maxsize=QUEUE_BATCHES * args.batch_size)
+    decode_videos(args.videos, frames, args.stride, decoders)
+
+    parts = []
+    started = time.perf_counter()
+    scored = 0
+    for batch in batches(frames, decoders, args.batch_size):
+        detected, keypoints, features, predictions = score_batch(batch, args.exercise, pose_model, nn_model)
+        parts.append((
+            np.array([video for video, _, _, _ in batch], dtype=np.int32),
+            np.array([index for _, index, _, _ in batch], dtype=np.int32),
+            np.array([ms for _, _, ms, _ in batch], dtype=np.float64),
+            detected, keypoints, features, predictions,
+        ))
+        scored += len(batch)
+        elapsed = time.perf_counter() - started
+        print(f"\r{scored} frames, {scored / elapsed:.1f} frames/s", end="", flush=True)
+    print()
+    if not parts:
+        print("No frames decoded.")
+        return
+
+    video, frame, timestamp_ms, detected, keypoints, features, predictions = (
+        np.concatenate(column) for column in zip(*parts))
+    order = np.lexsort((frame, video))  # decoders interleave videos
+    columns = {
+        "video": np.array(args.videos)[video[order]],
+        "frame": frame[order],
+        "timestamp_ms": timestamp_ms[order],
+        "detected": detected[order],
+        "keypoints": keypoints[order].reshape(-1, KEYPOINT_COUNT * 3),
+        "features": features[order],
+        "prediction": predictions[order],
+    }
+    path = write_columns(args.output, columns)
+    print(f"Scored {scored} frames ({int(detected.sum())} with a detection) "
+          f"in {time.perf_counter() - started:.1f}s → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Accuracy/latency benchmark for pose model size and input resolution.
+
+For every pose model and input size it measures, on CPU and on a fixed
+set of frames:
+
+    latency   letterbox + pose model + main subject, one frame per call
+    memory    peak resident memory added by loading and running the model
+    accuracy  end-to-end form classification on the labeled combined.csv
+              images through the NN checkpoint (no detection counts as wrong)
+
+Each configuration runs in a fresh process so memory and caches do not
+leak between them. The results are printed as a table with the Pareto
+optimal configurations (nothing else is both faster and more accurate)
+marked, and written to JSON.
+
+    python benchmark_pose.py --csv ../../../ai/software/combined.csv --images images
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+import pandas as pd
+import torch
+from ultralytics import YOLO
+
+from NN import NN
+from preprocessingv2 import Letterbox, detect_keypoints_batch, main_subject, pose_features_batch
+
+POSE_MODELS = ["models/yolo11n-pose.pt", "models/yolo11s-pose.pt", "models/yolov8n-pose.pt"]
+INPUT_SIZES = [320, 480, 640]
+NN_MODEL_PATH = "model_epoch_74.pt"
+LATENCY_FRAMES = 50  # frames timed per configuration
+WARMUP_FRAMES = 5
+ACCURACY_BATCH = 16
+THRESHOLD = 0.5  # sigmoid output above which a rep counts as correct form
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes on macOS, KiB on Linux
+
+
+def load_images(paths):
+    images = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            raise FileNotFoundError(f"Image not found: {path}")
+        images.append(image)
+    return images
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def benchmark_config(model_path, size, labeled, args):
+    """Runs one (model, size) configuration; called in a fresh process"""
+    torch.set_num_threads(args.threads)
+    images = load_images([os.path.join(args.images, path) for path in labeled["image_path"]])
+    nn_model = NN()
+    nn_model.load_state_dict(torch.load(args.nn_model, weights_only=True))
+    nn_model.eval()
+
+    baseline = peak_rss_mb()
+    pose_model = YOLO(model_path)
+    letterbox = Letterbox(size)
+
+    frames = images[:args.latency_frames]
+    latencies = []
+    for i in range(args.warmup + len(frames)):
+        frame = frames[i % len(frames)]
+        started = time.perf_counter()
+        main_subject(pose_model(letterbox.load([frame]), verbose=False)[0])
+        if i >= args.warmup:
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    batch_letterbox = Letterbox(size, ACCURACY_BATCH)
+    keypoints = []
+    for start in range(0, len(images), ACCURACY_BATCH):
+        keypoints.extend(detect_keypoints_batch(images[start:start + ACCURACY_BATCH], pose_model, batch_letterbox))
+    memory = peak_rss_mb() - baseline
+
+    exercises = labeled["exercise"].to_numpy()
+    labels = labeled["label"].to_numpy()
+    detected = np.array([kp is not None for kp in keypoints])
+    predictions = np.zeros(len(labeled), dtype=bool)
+    for exercise in np.unique(exercises):
+        rows = np.flatnonzero(detected & (exercises == exercise))
+        if len(rows) == 0:
+            continue
+        kp = np.stack([keypoints[row][:, :2] for row in rows])
+        with torch.inference_mode():
+            logits = nn_model(torch.from_numpy(pose_features_batch(kp, exercise)))
+        predictions[rows] = torch.sigmoid(logits).squeeze(1).numpy() > THRESHOLD
+    correct = detected & (predictions == labels.astype(bool))
+
+    return {
+        "model": os.path.basename(model_path),
+        "size": size,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+        },
+        "memory_mb": round(memory, 1),
+        "detection_rate": round(float(detected.mean()), 4),
+        "accuracy": round(float(correct.mean()), 4),
+        "per_exercise_accuracy": {
+            int(exercise): round(float(correct[exercises == exercise].mean()), 4)
+            for exercise in np.unique(exercises)
+        },
+    }
+
+
+def mark_pareto(results):
+    """Flags results that no other result beats on both p50 latency and accuracy"""
+    for result in results:
+        result["pareto"] = not any(
+            other["latency_ms"]["p50"] <= result["latency_ms"]["p50"]
+            and other["accuracy"] >= result["accuracy"]
+            and (other["latency_ms"]["p50"], other["accuracy"]) != (result["latency_ms"]["p50"], result["accuracy"])
+            for other in results
+        )
+
+
+def print_table(results):
+    print(f"\n{'model':<20} {'size':>5} {'p50 ms':>8} {'p95 ms':>8} {'mem MB':>8} {'detect':>7} {'acc':>6}  pareto")
+    print("-" * 78)
+    for r in sorted(results, key=lambda r: r["latency_ms"]["p50"]):
+        print(f"{r['model']:<20} {r['size']:>5} {r['latency_ms']['p50']:>8} {r['latency_ms']['p95']:>8} "
+              f"{r['memory_mb']:>8} {r['detection_rate']:>7.1%} {r['accuracy']:>6.1%}  {'★' if r['pareto'] else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pose models across input sizes")
+    parser.add_argument("--csv", default="combined.csv", help="labeled images: image_path, exercise, label")
+    parser.add_argument("--images", default="images", help="directory the csv's image paths are relative to")
+    parser.add_argument("--models", nargs="+", default=POSE_MODELS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=INPUT_SIZES)
+    parser.add_argument("--nn-model", default=NN_MODEL_PATH)
+    parser.add_argument("--latency-frames", type=int, default=LATENCY_FRAMES)
+    parser.add_argument("--warmup", type=int, default=WARMUP_FRAMES)
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads(), help="torch CPU threads")
+    parser.add_argument("--output", default="benchmark_pose_results.json")
+    args = parser.parse_args()
+
+    # Sorted so every run and configuration times the same frames
+    labeled = pd.read_csv(args.csv).sort_values("image_path", ignore_index=True)
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for model_path in args.models:
+        for size in args.sizes:
+            print(f"Benchmarking {model_path} at {size}x{size}...")
+            with context.Pool(1) as pool:
+                results.append(pool.apply(benchmark_config, (model_path, size, labeled, args)))
+
+    mark_pareto(results)
+    print_table(results)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "csv": args.csv,
+            "images": len(labeled),
+            "latency_frames": args.latency_frames,
+            "threads": args.threads,
+            "nn_model": args.nn_model,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
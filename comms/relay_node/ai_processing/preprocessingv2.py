@@ -14,6 +14,12 @@ LATERAL_RAISE_KEYPOINTS = [5, 6, 7, 8, 9, 10, 11, 12]
 
 KEYPOINTS = [BICEP_CURLS_KEYPOINTS, SQUATS_KEYPOINTS, LATERAL_RAISE_KEYPOINTS]
 
+# Camera direction that sees each exercise's joint angles best: elbows and
+# knees bend in the side view, lateral raises open in the front view
+PREFERRED_VIEWS = ["side", "side", "front"]
+MIN_VIEW_CONFIDENCE = 0.5  # below this the preferred view loses to a clearer one
+LETTERBOX_FILL = 114  # padding grey, as in ultralytics' own letterbox
+
 POSE_MODEL = "models/yolo11n-pose.pt"
 pose_model = YOLO(POSE_MODEL)
 
@@ -23,8 +29,9 @@ def get_poses(image_path):
     if image is None:
         raise FileNotFoundError(f"Image not found: {image_path}")
 
-    resized = cv2.resize(image, (IMAGE_SIZE, IMAGE_SIZE))
-    return pose_model(resized, verbose=False)
+    # Letterboxed like live frames (preprocessing_rt), so training sees the
+    # same undistorted geometry as inference
+    return pose_model(letterbox.load([image]), verbose=False)
 
 def augment_pose_data(pose_estimates):
     augmented = pose_estimates.copy()
@@ -68,81 +75,16 @@ def get_and_process_pose(image_path, exercise, augment):
     augment = False
     poses = get_poses(image_path)
 
-    #augment poses
-    poses = poses[0]
-    if len(poses.boxes) > 0:
-        # Pick main subject
-        areas = (poses.boxes.xyxy[:,2] - poses.boxes.xyxy[:,0]) * (poses.boxes.xyxy[:,3] - poses.boxes.xyxy[:,1])
-        main_idx = torch.argmax(areas)
-        kp = poses.keypoints.data[main_idx].cpu().numpy()
-        kp = kp[:, :2] / IMAGE_SIZE
-
-        if augment: #figure this out later
-            kp = augment_pose_data(kp)
-
-        #process poses
-        processedArray = [] 
-        for i in range(17):
-            if (i in KEYPOINTS[exercise]):
-                processedArray.extend(kp[i])
-            else:
-                processedArray.extend([0.0, 0.0])
-        
-        if (exercise == 0): #bicep curls
-            processedArray.append(cos_angle_between_points(kp[6], kp[8], kp[8], kp[10]))
-            processedArray.append(cos_angle_between_points(kp[5], kp[7], kp[7], kp[9]))
-            processedArray.append(cos_angle_between_points(kp[8], kp[6], kp[6], kp[12]))
-            processedArray.append(cos_angle_between_points(kp[7], kp[5], kp[5], kp[11]))
-            processedArray.append(cos_angle_between_points(kp[6], kp[12], kp[6], [kp[6][0], kp[6][1] - 1]))
-            processedArray.append(cos_angle_between_points(kp[5], kp[11], kp[5], [kp[5][0], kp[5][1] - 1])) 
-
-            for i in range(16):
-                processedArray.append(0.0)
-            
-            processedArray.extend([1, 0, 0])
-
-        elif (exercise == 1): #squats
-            for i in range(6):
-                processedArray.append(0.0)
-            
-            processedArray.append(cos_angle_between_points(kp[5], kp[11], kp[11], kp[13]))
-            processedArray.append(cos_angle_between_points(kp[6], kp[12], kp[12], kp[14]))
-            processedArray.append(cos_angle_between_points(kp[11], kp[13], kp[13], kp[15]))
-            processedArray.append(cos_angle_between_points(kp[12], kp[14], kp[14], kp[16]))
-            processedArray.append(cos_angle_between_points(kp[11], kp[13], kp[13], [kp[13][0] - 1, kp[13][1]]))
-            processedArray.append(cos_angle_between_points(kp[12], kp[14], kp[14], [kp[14][0] - 1, kp[14][1]]))
-            processedArray.append(cos_angle_between_points(kp[13], kp[15], kp[15], [kp[15][0] - 1, kp[15][1]]))
-            processedArray.append(cos_angle_between_points(kp[14], kp[16], kp[16], [kp[16][0] - 1, kp[16][1]]))
-            processedArray.append(kp[5][0] - kp[13][0])
-            processedArray.append(kp[5][0] - kp[14][0])
-            processedArray.append(kp[6][0] - kp[13][0])
-            processedArray.append(kp[6][0] - kp[14][0])
-
-            for i in range(4):
-                processedArray.append(0.0)
-            
-            processedArray.extend([0, 1, 0])
-
-        else:
-            processedArray.append(cos_angle_between_points(kp[6], kp[8], kp[8], kp[10]))
-            processedArray.append(cos_angle_between_points(kp[5], kp[7], kp[7], kp[9]))
-            processedArray.append(cos_angle_between_points(kp[8], kp[6], kp[6], kp[12]))
-            processedArray.append(cos_angle_between_points(kp[7], kp[5], kp[5], kp[11]))
-
-            for i in range(14):
-                processedArray.append(0.0)
-
-            processedArray.append(cos_angle_between_points(kp[8], kp[6], kp[6], kp[5]))
-            processedArray.append(cos_angle_between_points(kp[6], kp[5], kp[5], kp[7]))
-            processedArray.append(kp[10][1] - kp[6][1])
-            processedArray.append(kp[9][1] - kp[5][1])
-            processedArray.extend([0, 0, 1])
-            
+    kp = main_subject(poses[0])
+    if kp is None:
+        print(image_path, 0)
+        return None
+    kp = letterbox.to_frame(kp[:, :2], 0)
 
-        flattened = np.array(processedArray)
+    if augment: #figure this out later
+        kp = augment_pose_data(kp)
 
-        return flattened
-    print(image_path, len(poses.boxes))
+    return pose_features(kp, exercise)
     
 
 class NNDataset(Dataset):
@@ -179,80 +121,251 @@ def preprocessing(csv_filePath, batch_size, isTraining):
 
     return dataloader, None
 
-def preprocessing_rt(np_array, exercise):
-    resized = cv2.resize(np_array, (IMAGE_SIZE, IMAGE_SIZE))
-    poses = pose_model(resized, verbose=False)
-
-    poses = poses[0]
-    if len(poses.boxes) > 0:
-        # Pick main subject
-        areas = (poses.boxes.xyxy[:,2] - poses.boxes.xyxy[:,0]) * (poses.boxes.xyxy[:,3] - poses.boxes.xyxy[:,1])
-        main_idx = torch.argmax(areas)
-        kp = poses.keypoints.data[main_idx].cpu().numpy()
-        kp = kp[:, :2] / IMAGE_SIZE
-
-        #process poses
-        processedArray = [] 
-        for i in range(17):
-            if (i in KEYPOINTS[exercise]):
-                processedArray.extend(kp[i])
-            else:
-                processedArray.extend([0.0, 0.0])
-        
-        if (exercise == 0): #bicep curls
-            processedArray.append(cos_angle_between_points(kp[6], kp[8], kp[8], kp[10]))
-            processedArray.append(cos_angle_between_points(kp[5], kp[7], kp[7], kp[9]))
-            processedArray.append(cos_angle_between_points(kp[8], kp[6], kp[6], kp[12]))
-            processedArray.append(cos_angle_between_points(kp[7], kp[5], kp[5], kp[11]))
-            processedArray.append(cos_angle_between_points(kp[6], kp[12], kp[6], [kp[6][0], kp[6][1] - 1]))
-            processedArray.append(cos_angle_between_points(kp[5], kp[11], kp[5], [kp[5][0], kp[5][1] - 1])) 
-
-            for i in range(16):
-                processedArray.append(0.0)
-            
-            processedArray.extend([1, 0, 0])
-
-        elif (exercise == 1): #squats
-            for i in range(6):
-                processedArray.append(0.0)
-            
-            processedArray.append(cos_angle_between_points(kp[5], kp[11], kp[11], kp[13]))
-            processedArray.append(cos_angle_between_points(kp[6], kp[12], kp[12], kp[14]))
-            processedArray.append(cos_angle_between_points(kp[11], kp[13], kp[13], kp[15]))
-            processedArray.append(cos_angle_between_points(kp[12], kp[14], kp[14], kp[16]))
-            processedArray.append(cos_angle_between_points(kp[11], kp[13], kp[13], [kp[13][0] - 1, kp[13][1]]))
-            processedArray.append(cos_angle_between_points(kp[12], kp[14], kp[14], [kp[14][0] - 1, kp[14][1]]))
-            processedArray.append(cos_angle_between_points(kp[13], kp[15], kp[15], [kp[15][0] - 1, kp[15][1]]))
-            processedArray.append(cos_angle_between_points(kp[14], kp[16], kp[16], [kp[16][0] - 1, kp[16][1]]))
-            processedArray.append(kp[5][0] - kp[13][0])
-            processedArray.append(kp[5][0] - kp[14][0])
-            processedArray.append(kp[6][0] - kp[13][0])
-            processedArray.append(kp[6][0] - kp[14][0])
-
-            for i in range(4):
-                processedArray.append(0.0)
-            
-            processedArray.extend([0, 1, 0])
-
+def main_subject(poses):
+    """(17, 3) keypoints (x, y in pixels, confidence) of the largest detection, or None"""
+    if len(poses.boxes) == 0:
+        return None
+    areas = (poses.boxes.xyxy[:,2] - poses.boxes.xyxy[:,0]) * (poses.boxes.xyxy[:,3] - poses.boxes.xyxy[:,1])
+    main_idx = torch.argmax(areas)
+    return poses.keypoints.data[main_idx].cpu().numpy()
+
+def pose_features(kp, exercise):
+    """59 NN inputs from (17, 2) keypoints normalized to the frame.
+
+    Angles are taken between these normalized points, so on a non-square
+    frame they are not the true image angles. The trained checkpoints
+    expect exactly that; correcting it means retraining.
+    """
+    #process poses
+    processedArray = [] 
+    for i in range(17):
+        if (i in KEYPOINTS[exercise]):
+            processedArray.extend(kp[i])
         else:
-            processedArray.append(cos_angle_between_points(kp[6], kp[8], kp[8], kp[10]))
-            processedArray.append(cos_angle_between_points(kp[5], kp[7], kp[7], kp[9]))
-            processedArray.append(cos_angle_between_points(kp[8], kp[6], kp[6], kp[12]))
-            processedArray.append(cos_angle_between_points(kp[7], kp[5], kp[5], kp[11]))
-
-            for i in range(14):
-                processedArray.append(0.0)
-
-            processedArray.append(cos_angle_between_points(kp[8], kp[6], kp[6], kp[5]))
-            processedArray.append(cos_angle_between_points(kp[6], kp[5], kp[5], kp[7]))
-            processedArray.append(kp[10][1] - kp[6][1])
-            processedArray.append(kp[9][1] - kp[5][1])
-            processedArray.extend([0, 0, 1])
-            
+            processedArray.extend([0.0, 0.0])
+
+    if (exercise == 0): #bicep curls
+        processedArray.append(cos_angle_between_points(kp[6], kp[8], kp[8], kp[10]))
+        processedArray.append(cos_angle_between_points(kp[5], kp[7], kp[7], kp[9]))
+        processedArray.append(cos_angle_between_points(kp[8], kp[6], kp[6], kp[12]))
+        processedArray.append(cos_angle_between_points(kp[7], kp[5], kp[5], kp[11]))
+        processedArray.append(cos_angle_between_points(kp[6], kp[12], kp[6], [kp[6][0], kp[6][1] - 1]))
+        processedArray.append(cos_angle_between_points(kp[5], kp[11], kp[5], [kp[5][0], kp[5][1] - 1])) 
+
+        for i in range(16):
+            processedArray.append(0.0)
+
+        processedArray.extend([1, 0, 0])
+
+    elif (exercise == 1): #squats
+        for i in range(6):
+            processedArray.append(0.0)
+
+        processedArray.append(cos_angle_between_points(kp[5], kp[11], kp[11], kp[13]))
+        processedArray.append(cos_angle_between_points(kp[6], kp[12], kp[12], kp[14]))
+        processedArray.append(cos_angle_between_points(kp[11], kp[13], kp[13], kp[15]))
+        processedArray.append(cos_angle_between_points(kp[12], kp[14], kp[14], kp[16]))
+        processedArray.append(cos_angle_between_points(kp[11], kp[13], kp[13], [kp[13][0] - 1, kp[13][1]]))
+        processedArray.append(cos_angle_between_points(kp[12], kp[14], kp[14], [kp[14][0] - 1, kp[14][1]]))
+        processedArray.append(cos_angle_between_points(kp[13], kp[15], kp[15], [kp[15][0] - 1, kp[15][1]]))
+        processedArray.append(cos_angle_between_points(kp[14], kp[16], kp[16], [kp[16][0] - 1, kp[16][1]]))
+        processedArray.append(kp[5][0] - kp[13][0])
+        processedArray.append(kp[5][0] - kp[14][0])
+        processedArray.append(kp[6][0] - kp[13][0])
+        processedArray.append(kp[6][0] - kp[14][0])
+
+        for i in range(4):
+            processedArray.append(0.0)
+
+        processedArray.extend([0, 1, 0])
+
+    else:
+        processedArray.append(cos_angle_between_points(kp[6], kp[8], kp[8], kp[10]))
+        processedArray.append(cos_angle_between_points(kp[5], kp[7], kp[7], kp[9]))
+        processedArray.append(cos_angle_between_points(kp[8], kp[6], kp[6], kp[12]))
+        processedArray.append(cos_angle_between_points(kp[7], kp[5], kp[5], kp[11]))
+
+        for i in range(14):
+            processedArray.append(0.0)
+
+        processedArray.append(cos_angle_between_points(kp[8], kp[6], kp[6], kp[5]))
+        processedArray.append(cos_angle_between_points(kp[6], kp[5], kp[5], kp[7]))
+        processedArray.append(kp[10][1] - kp[6][1])
+        processedArray.append(kp[9][1] - kp[5][1])
+        processedArray.extend([0, 0, 1])
+
+
+    flattened = np.array(processedArray)
+
+    return flattened
+
+class Letterbox:
+    """Reused model input for a batch of frames.
+
+    Each frame is scaled to fit IMAGE_SIZE without changing its aspect
+    ratio and resized straight into its slot of a preallocated canvas; the
+    canvas is then converted into a preallocated RGB float tensor that the
+    pose model takes as is, so ultralytics does not resize again. Padding
+    is only repainted when a slot's frame size changes.
+    """
+
+    def __init__(self, size=IMAGE_SIZE, batch=1):
+        self.size = size
+        self.canvas = np.empty((0, size, size, 3), dtype=np.uint8)
+        self.input = torch.empty((0, 3, size, size), dtype=torch.float32)
+        self.geometry = []  # per slot: (frame height, frame width, scale, pad x, pad y, scaled width, scaled height)
+        self.reserve(batch)
+
+    def reserve(self, batch):
+        if batch <= len(self.geometry):
+            return
+        self.canvas = np.full((batch, self.size, self.size, 3), LETTERBOX_FILL, dtype=np.uint8)
+        self.input = torch.empty((batch, 3, self.size, self.size), dtype=torch.float32)
+        self.geometry = [None] * batch
+
+    def load(self, frames):
+        """Letterboxes BGR frames; returns the (n, 3, size, size) model input"""
+        self.reserve(len(frames))
+        for i, frame in enumerate(frames):
+            height, width = frame.shape[:2]
+            geometry = self.geometry[i]
+            if geometry is None or geometry[:2] != (height, width):
+                scale = min(self.size / width, self.size / height)
+                scaled_width, scaled_height = round(width * scale), round(height * scale)
+                pad_x = (self.size - scaled_width) // 2
+                pad_y = (self.size - scaled_height) // 2
+                geometry = self.geometry[i] = (height, width, scale, pad_x, pad_y, scaled_width, scaled_height)
+                self.canvas[i] = LETTERBOX_FILL
+            _, _, _, pad_x, pad_y, scaled_width, scaled_height = geometry
+            inner = self.canvas[i, pad_y:pad_y + scaled_height, pad_x:pad_x + scaled_width]
+            cv2.resize(frame, (scaled_width, scaled_height), dst=inner, interpolation=cv2.INTER_LINEAR)
+
+        n = len(frames)
+        canvas = torch.from_numpy(self.canvas[:n])
+        model_input = self.input[:n]
+        for channel in range(3):  # BGR canvas to RGB planes
+            model_input[:, channel].copy_(canvas[..., 2 - channel])
+        return model_input.div_(255.0)
+
+    def to_frame(self, kp, slot=0):
+        """Keypoints in model input pixels to x, y normalized to the frame"""
+        height, width, scale, pad_x, pad_y, _, _ = self.geometry[slot]
+        kp[:, 0] = (kp[:, 0] - pad_x) / scale / width
+        kp[:, 1] = (kp[:, 1] - pad_y) / scale / height
+        return kp
+
+letterbox = Letterbox()
 
-        flattened = np.array(processedArray)
-
-        return flattened
-    
-    print(len(poses.boxes))
-    return None
+def preprocessing_rt(np_array, exercise):
+    poses = pose_model(letterbox.load([np_array]), verbose=False)
+
+    kp = main_subject(poses[0])
+    if kp is None:
+        print(0)
+        return None
+    return pose_features(letterbox.to_frame(kp[:, :2], 0), exercise)
+
+def detect_keypoints_batch(frames, model=None, letterbox=letterbox):
+    """Runs the pose model (default: pose_model) once on all frames.
+
+    Returns per frame the main subject's (17, 3) keypoints with x, y
+    normalized to the frame and the model's confidence, or None.
+    """
+    model = pose_model if model is None else model
+    keypoints = []
+    for slot, poses in enumerate(model(letterbox.load(frames), verbose=False)):
+        kp = main_subject(poses)
+        if kp is not None:
+            letterbox.to_frame(kp, slot)
+        keypoints.append(kp)
+    return keypoints
+
+def view_confidence(kp, exercise):
+    """Mean confidence of the joints the exercise's features are built from"""
+    return float(kp[KEYPOINTS[exercise], 2].mean())
+
+def best_view(keypoints, views, exercise):
+    """Index of the camera to take features from, or None if nobody was seen.
+
+    A camera facing the exercise's preferred direction wins if its joints
+    are confidently detected; otherwise the most confident camera does.
+    """
+    scored = [(view_confidence(kp, exercise), i) for i, kp in enumerate(keypoints) if kp is not None]
+    if not scored:
+        return None
+    preferred = [score for score in scored
+                 if views[score[1]] == PREFERRED_VIEWS[exercise] and score[0] >= MIN_VIEW_CONFIDENCE]
+    return max(preferred or scored)[1]
+
+def preprocessing_multi(frames, views, exercise, model=None):
+    """Features from the best of several simultaneous camera frames.
+
+    views[i] is "side" or "front" for frames[i]; model defaults to
+    pose_model. Returns (features, index of the camera used), or
+    (None, None) if no camera saw anyone.
+    """
+    keypoints = detect_keypoints_batch(frames, model)
+    best = best_view(keypoints, views, exercise)
+    if best is None:
+        return None, None
+    return pose_features(keypoints[best][:, :2], exercise), best
+
+def cos_angles_batch(A, B, C, D):
+    """cos_angle_between_points over (n, 2) point arrays"""
+    AB = A - B
+    CD = D - C
+    magnitudes = np.linalg.norm(AB, axis=-1) * np.linalg.norm(CD, axis=-1)
+    dot_products = (AB * CD).sum(axis=-1)
+    return np.where(magnitudes == 0, 1.0, dot_products / np.where(magnitudes == 0, 1.0, magnitudes))
+
+def pose_features_batch(kp, exercise):
+    """pose_features for (n, 17, 2) keypoints at once; returns (n, 59) float32"""
+    n = len(kp)
+    features = np.zeros((n, 59), dtype=np.float32)
+    for i in KEYPOINTS[exercise]:
+        features[:, 2 * i:2 * i + 2] = kp[:, i]
+    up = np.array([0.0, 1.0])
+    left = np.array([1.0, 0.0])
+    if exercise == 0: #bicep curls
+        angles = [
+            (kp[:, 6], kp[:, 8], kp[:, 8], kp[:, 10]),
+            (kp[:, 5], kp[:, 7], kp[:, 7], kp[:, 9]),
+            (kp[:, 8], kp[:, 6], kp[:, 6], kp[:, 12]),
+            (kp[:, 7], kp[:, 5], kp[:, 5], kp[:, 11]),
+            (kp[:, 6], kp[:, 12], kp[:, 6], kp[:, 6] - up),
+            (kp[:, 5], kp[:, 11], kp[:, 5], kp[:, 5] - up),
+        ]
+        for column, points in enumerate(angles, start=34):
+            features[:, column] = cos_angles_batch(*points)
+    elif exercise == 1: #squats
+        angles = [
+            (kp[:, 5], kp[:, 11], kp[:, 11], kp[:, 13]),
+            (kp[:, 6], kp[:, 12], kp[:, 12], kp[:, 14]),
+            (kp[:, 11], kp[:, 13], kp[:, 13], kp[:, 15]),
+            (kp[:, 12], kp[:, 14], kp[:, 14], kp[:, 16]),
+            (kp[:, 11], kp[:, 13], kp[:, 13], kp[:, 13] - left),
+            (kp[:, 12], kp[:, 14], kp[:, 14], kp[:, 14] - left),
+            (kp[:, 13], kp[:, 15], kp[:, 15], kp[:, 15] - left),
+            (kp[:, 14], kp[:, 16], kp[:, 16], kp[:, 16] - left),
+        ]
+        for column, points in enumerate(angles, start=40):
+            features[:, column] = cos_angles_batch(*points)
+        features[:, 48] = kp[:, 5, 0] - kp[:, 13, 0]
+        features[:, 49] = kp[:, 5, 0] - kp[:, 14, 0]
+        features[:, 50] = kp[:, 6, 0] - kp[:, 13, 0]
+        features[:, 51] = kp[:, 6, 0] - kp[:, 14, 0]
+    else: #lateral raises
+        angles = {
+            34: (kp[:, 6], kp[:, 8], kp[:, 8], kp[:, 10]),
+            35: (kp[:, 5], kp[:, 7], kp[:, 7], kp[:, 9]),
+            36: (kp[:, 8], kp[:, 6], kp[:, 6], kp[:, 12]),
+            37: (kp[:, 7], kp[:, 5], kp[:, 5], kp[:, 11]),
+            52: (kp[:, 8], kp[:, 6], kp[:, 6], kp[:, 5]),
+            53: (kp[:, 6], kp[:, 5], kp[:, 5], kp[:, 7]),
+        }
+        for column, points in angles.items():
+            features[:, column] = cos_angles_batch(*points)
+        features[:, 54] = kp[:, 10, 1] - kp[:, 6, 1]
+        features[:, 55] = kp[:, 9, 1] - kp[:, 5, 1]
+    features[:, 56 + exercise] = 1
+    return features
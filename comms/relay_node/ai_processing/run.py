@@ -1,18 +1,32 @@
 import torch
 import time
-import struct
 import socket
+import sys
+from pathlib import Path
 import cv2
-import numpy as np
 from ultralytics import YOLO
 from NN import NN
-from preprocessingv2 import preprocessing_rt
+from preprocessingv2 import preprocessing_multi
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from protocol import BIOMETRICS, BIOMETRICS_FMT, FEATURES, STAMP, feature_buffer
+from relay_hub import DEFAULT_TTL, TOPIC_NAMES, HubClient
+from shm_ring import RingReader, ring_name
 
 # ==== CONFIG ====
 DEVICE = torch.device("cpu")
 POSE_MODEL_PATH = "models/yolo11s-pose.pt"
 NN_MODEL_PATH = "model_epoch_74.pt"
 EXERCISE = 0 # 0=bicep curls, 1=squats, 2=lateral raise
+# (cv2 source, "side" or "front"); all cameras share one batched pose model
+# call per frame, e.g. [(1, "side"), (0, "front")]
+CAMERAS = [(1, "side")]
+# None sends features straight to rpc_server's port 5556 and reads biometrics
+# from 5557. ("127.0.0.1", 5560) uses relay_hub.py instead, which only
+# reaches the classifier when started with --rpc
+RELAY_HUB = None
+RELAY_SHM = False  # read biometrics from the hub's shared-memory ring (relay_hub.py --shm)
+FEATURE_TTL = DEFAULT_TTL  # seconds after capture a feature vector is still worth sending
 
 # ==== LOAD MODELS ====
 pose_model = YOLO(POSE_MODEL_PATH)
@@ -20,29 +34,104 @@ NN_model = NN().to(DEVICE)
 NN_model.load_state_dict(torch.load(NN_MODEL_PATH, weights_only=True))
 NN_model.eval()
 
-# ==== REAL-TIME LOOP ====
-cap = cv2.VideoCapture(1, cv2.CAP_AVFOUNDATION)  # 0 for webcam, or replace with video file path
+# ==== RELAY LINK ====
+hub = None
+if RELAY_HUB:
+    hub = HubClient(*RELAY_HUB)
+    if not RELAY_SHM:
+        hub.subscribe(BIOMETRICS)
+biometrics_ring = None
+
+def current_mode():
+    """Relay mode id of the latest biometrics (0 if unknown)"""
+    global biometrics_ring
+    if RELAY_SHM:
+        try:
+            if biometrics_ring is None:
+                biometrics_ring = RingReader(ring_name(TOPIC_NAMES[BIOMETRICS]))
+        except FileNotFoundError as e:
+            print(f"Relay hub ring unavailable: {e}")
+            return 0
+        latest = biometrics_ring.latest()
+        return BIOMETRICS_FMT.unpack(latest[1])[0] if latest else 0
+
+    if hub is not None:
+        try:
+            hub.poll()
+        except OSError as e:
+            print(f"Relay hub unavailable: {e}")
+            hub.close()
+            return 0
+        payload = hub.latest.get(BIOMETRICS)
+        return BIOMETRICS_FMT.unpack(payload)[0] if payload else 0
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.connect(("127.0.0.1", 5557))
+    buffer = s.recv(BIOMETRICS_FMT.size)
+    s.close()
+    return BIOMETRICS_FMT.unpack(buffer)[0]
+
+sequence = 0  # camera frames read
+stale_dropped = 0  # feature vectors that were too old to send
 
-if not cap.isOpened():
-    print("❌ Cannot open camera or video")
-    exit()
+def send_features(packed, sequence, captured):
+    """Sends one feature vector stamped with its frame's sequence and capture time"""
+    global stale_dropped
+    if time.time() - captured > FEATURE_TTL:
+        stale_dropped += 1
+        print(f"Dropped stale features for frame {sequence} ({stale_dropped} so far)")
+        return
+    if hub is not None:
+        try:
+            hub.publish(FEATURES, STAMP.pack(sequence, captured) + packed)
+        except OSError as e:
+            print(f"Relay hub unavailable: {e}")
+        return
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.connect(("127.0.0.1", 5556))
+    s.send(packed)
+    s.close()
+
+# ==== CAMERAS ====
+caps = []
+for source, view in CAMERAS:
+    cap = cv2.VideoCapture(source, cv2.CAP_AVFOUNDATION)  # 0 for webcam, or replace with video file path
+    if not cap.isOpened():
+        print(f"❌ Cannot open camera or video {source} ({view})")
+        exit()
+    caps.append(cap)
+views = [view for _, view in CAMERAS]
+
+def read_cameras():
+    """One frame per camera, or None if a stream ended.
+
+    All cameras grab before any decodes, so the views are as close in time
+    as the devices allow.
+    """
+    grabbed = [cap.grab() for cap in caps]
+    if not all(grabbed):
+        return None
+    frames = []
+    for cap in caps:
+        ret, frame = cap.retrieve()
+        if not ret:
+            return None
+        frames.append(frame)
+    return frames
 
+# ==== REAL-TIME LOOP ====
 while True:
-    ret, frame = cap.read()
-    if not ret:
+    frames = read_cameras()
+    if frames is None:
         print("Stream ended or failed.")
         break
+    captured = time.time()
+    frame = frames[0]
+    sequence += 1
 
     # Run preprocessing and skip if no detection
 
-    fmt = "<i i i b"
-    size = struct.calcsize(fmt)
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.connect(("127.0.0.1", 5557))
-    buffer = s.recv(size)
-    s.close()
-    values = struct.unpack(fmt, buffer)
-    exercise = values[0]
+    exercise = current_mode()
     exercise_code = -1
     if exercise == 2:
         exercise_code = 2
@@ -53,7 +142,7 @@ while True:
     if exercise_code == -1:
         continue
 
-    pose_data = preprocessing_rt(frame, exercise_code)
+    pose_data, best = preprocessing_multi(frames, views, exercise_code, pose_model)
     if pose_data is None:
         # no detection — just show frame
         cv2.imshow("Real-Time Feed", frame)
@@ -66,24 +155,19 @@ while True:
         pose_tensor = torch.tensor(pose_data, dtype=torch.float32).to(DEVICE)
         
         print(pose_tensor)
-        raw_array = np.array(pose_tensor).tolist()
-        fmt = '<' + ('f' * 59)
-        packed = struct.pack(fmt, *raw_array)
-        print("\n")
-        print(raw_array)
-        print("\n")
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect(("127.0.0.1", 5556))
-        s.send(packed)
+        # float32 bytes of the tensor itself, no list round trip
+        packed = feature_buffer(pose_tensor.numpy())
+        send_features(packed, sequence, captured)
 
         time.sleep(0.5)
 
-    # Just show the live frame (no overlay)
-    cv2.imshow("Real-Time Feed", frame)
+    # Just show the live frame of the view used (no overlay)
+    cv2.imshow("Real-Time Feed", frames[best])
 
     # press 'q' to quit
     if cv2.waitKey(1) & 0xFF == ord('q'):
         break
 
-cap.release()
+for cap in caps:
+    cap.release()
 cv2.destroyAllWindows()
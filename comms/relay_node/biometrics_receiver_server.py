@@ -1,109 +1,373 @@
 import asyncio
-import socket
 import struct
-import platform
 import json
-import os
+import sys
 
-from bleak import BleakClient, BleakScanner
+# bleak is imported where the BLE links use it, so that telemetry_log.py can
+# replay recordings through the codec and forwarder without it installed.
+from protocol import BIOMETRICS_FMT
 
 # UUIDs must match the ESP32 sketch
 DEVICE_NAME = "ESP32 Fitness Tracker"
 SERVICE_UUID = "4fafc201-1fb5-459e-8fcc-c5c9c331914b"
 CHARACTERISTIC_UUID = "beb5483e-36e1-4688-b7f5-ea07361b26a8"
 
-def clear_console():
-    """Clears the console screen."""
-    command = 'cls' if platform.system().lower() == 'windows' else 'clear'
-    os.system(command)
+# Relay (rpc_server.cpp) biometrics input
+RELAY_HOST = "127.0.0.1"
+RELAY_PORT = 5555
+PACKET_FMT = BIOMETRICS_FMT  # laid out like data_t in rpc_server.cpp
 
-def notification_handler(sender: int, data: bytearray):
-    """Handles incoming data from the BLE characteristic."""
-    message = data.decode('utf-8')
-    try:
-        # Parse the JSON string
-        sensor_data = json.loads(message)
-        
-        # Clear the console for a clean display
-        clear_console()
-
-        # Display the formatted data
-        print("--- ESP32 Fitness Tracker ---")
-        
-        mode = sensor_data.get('mode', 'N/A')
-        print(f"               Mode: {mode}")
-        mode_as_int = 0
-        if mode == 'Hr Only':
-            mode_as_int = 1
-        elif mode == 'Lat Raise':
-            mode_as_int = 2
-        elif mode == 'Squat':
-            mode_as_int = 3
-        elif mode == 'Bicep Curl':
-            mode_as_int = 4
-        
-        hr = sensor_data.get('hr', 0)
-        if hr > 0:
-            print(f"         Heart Rate: {hr} BPM")
+QUEUE_SIZE = 256
+RECONNECT_MIN_DELAY = 0.5  # seconds
+RECONNECT_MAX_DELAY = 10.0
+VIEW_INTERVAL = 0.25  # seconds between console redraws
+SCAN_TIMEOUT = 5.0  # seconds per discovery scan
+RESCAN_INTERVAL = 30.0  # seconds between scans for newly powered-on trackers
+
+# BLE telemetry: firmware with BLE_BINARY_TELEMETRY sends TelemetryPacket
+# (ble_handler.h), older firmware sends a JSON object.
+TELEMETRY_VERSION = 1
+TELEMETRY_V1 = struct.Struct("<B B B x h H I I")  # version, mode, start, hr, reps, seq, timestamp_ms
+JSON_PREFIX = ord('{')
+
+# Relay mode ids, indexed by the firmware Mode enum (HR_ONLY, BICEP_CURL, LATERAL_RAISE, SQUAT).
+# HR only is relay mode 0, which makes rpc_server clear its feature queue
+# when the user leaves an exercise.
+HR_ONLY_MODE = 0
+WIRE_MODE_IDS = (HR_ONLY_MODE, 4, 2, 3)
+
+MODE_IDS = {
+    'HR Only': HR_ONLY_MODE,  # FitnessTracker firmware
+    'Hr Only': HR_ONLY_MODE,  # hardware/ble_rep_receiver.py
+    'Lat Raise': 2,
+    'Squat': 3,
+    'Bicep Curl': 4,
+}
+MODE_NAMES = {mode_id: name for name, mode_id in reversed(MODE_IDS.items())}
+
+
+def decode_notification(data):
+    """Turns a raw BLE notification into a sample tuple.
+
+    The sample is (mode, hr, reps, start, seq, timestamp_ms); the first four
+    fields are what the relay receives. JSON notifications carry no sequence
+    number or device timestamp, so those are None.
+    """
+    if data and data[0] != JSON_PREFIX:
+        if data[0] != TELEMETRY_VERSION or len(data) != TELEMETRY_V1.size:
+            raise ValueError(f"unsupported telemetry packet (version {data[0]}, {len(data)} bytes)")
+        _, wire_mode, start, hr, reps, seq, timestamp_ms = TELEMETRY_V1.unpack(data)
+        return (WIRE_MODE_IDS[wire_mode], hr, reps, bool(start), seq, timestamp_ms)
+
+    sensor_data = json.loads(data.decode('utf-8'))
+    return (
+        MODE_IDS.get(sensor_data.get('mode', 'N/A'), HR_ONLY_MODE),
+        int(sensor_data.get('hr', 0)),
+        int(sensor_data.get('reps', 0)),
+        bool(sensor_data.get('start', False)),
+        None,
+        None,
+    )
+
+
+def coalesce(samples):
+    """Collapses a burst of (device, sample) pairs to the newest per device.
+
+    The relay only keeps the latest biometrics, but a device's mode changes
+    are kept because a switch to mode 0 clears its feature queue.
+    """
+    out = []
+    last = {}  # device -> index of its newest entry in out
+    for device, sample in samples:
+        i = last.get(device)
+        if i is not None and out[i][1][0] == sample[0]:
+            out[i] = (device, sample)
         else:
-            print("         Heart Rate: (No finger detected)")
-            
-        # Only show reps or "get ready" message in exercise modes
-        if mode != "HR Only":
-            # Check if the 'start' flag is true
-            if sensor_data.get('start', False):
-                print(f"               Reps: {sensor_data.get('reps', 'N/A')}")
+            last[device] = len(out)
+            out.append((device, sample))
+    return out
+
+
+class RelayForwarder:
+    """Forwards biometrics samples to the relay over one persistent connection.
+
+    submit() never blocks and is safe to call from BLE callbacks; run() owns
+    the socket, batches whatever queued up while it was writing and
+    reconnects with exponential backoff.
+
+    The relay never replies, so a write only shows that the bytes reached
+    the local socket. run() watches the connection for EOF, and after a
+    disconnect resends the last batch written for each device (the relay
+    may have closed before reading it, or restarted and lost its state).
+    """
+
+    def __init__(self, host=RELAY_HOST, port=RELAY_PORT, queue_size=QUEUE_SIZE, coalescing=True):
+        self.host = host
+        self.port = port
+        self.coalescing = coalescing  # False sends every sample, e.g. for throughput tests
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sent = 0
+        self.dropped = 0
+        self.unacked = {}  # device -> its entries in the last batch written
+
+    def submit(self, device, sample):
+        if self.queue.full():
+            # Only the newest biometrics matter, so shed the oldest.
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((device, sample))
+
+    def _drain(self, first):
+        samples = [first]
+        while not self.queue.empty():
+            samples.append(self.queue.get_nowait())
+        return coalesce(samples) if self.coalescing else samples
+
+    def _written(self, batch):
+        written = {}
+        for device, sample in batch:
+            written.setdefault(device, []).append((device, sample))
+        self.unacked.update(written)
+
+    def _requeue(self, pending):
+        """pending preceded by the unacknowledged samples, for a new connection"""
+        resend = [entry for entries in self.unacked.values() for entry in entries]
+        self.unacked = {}
+        return coalesce(resend + pending)
+
+    async def run(self):
+        delay = RECONNECT_MIN_DELAY
+        pending = []
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                print(f"Relay connection failed: {e}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+
+            print(f"Connected to relay at {self.host}:{self.port}")
+            delay = RECONNECT_MIN_DELAY
+            # The relay sends nothing, so this only completes when it closes
+            closed = asyncio.ensure_future(reader.read())
+            try:
+                while True:
+                    if not pending:
+                        next_sample = asyncio.ensure_future(self.queue.get())
+                        await asyncio.wait((next_sample, closed), return_when=asyncio.FIRST_COMPLETED)
+                        if not next_sample.done():
+                            next_sample.cancel()
+                        else:
+                            pending = self._drain(next_sample.result())
+                    if closed.done():
+                        raise ConnectionError("relay closed the connection")
+                    writer.write(b"".join(PACKET_FMT.pack(*sample[:4], device) for device, sample in pending))
+                    await writer.drain()
+                    self.sent += len(pending)
+                    self._written(pending)
+                    pending = []
+            except OSError as e:
+                # pending and the unacknowledged samples are resent once the connection is back
+                print(f"Relay connection lost: {e}")
+                pending = self._requeue(pending)
+            finally:
+                if closed.done():
+                    closed.exception()  # retrieved, a reset is already reported above
+                else:
+                    closed.cancel()
+                writer.close()
+
+
+class ConsoleView:
+    """Rate-limited terminal view of the latest notification from each tracker."""
+
+    def __init__(self, interval=VIEW_INTERVAL):
+        self.interval = interval
+        self.latest = {}  # device -> (sample, raw)
+        self.dirty = False
+
+    def update(self, device, sample, raw):
+        self.latest[device] = (sample, raw)
+        self.dirty = True
+
+    def render(self):
+        lines = []
+        for device in sorted(self.latest):
+            sample, raw = self.latest[device]
+            mode_id, hr, reps, start, seq, timestamp_ms = sample
+            lines.append(f"--- ESP32 Fitness Tracker [{device}] ---")
+
+            mode = MODE_NAMES.get(mode_id, 'N/A')
+            lines.append(f"               Mode: {mode}")
+
+            if hr > 0:
+                lines.append(f"         Heart Rate: {hr} BPM")
             else:
-                # If 'start' is false, it's the "get ready" period
-                print("\n             >> Get Ready! <<")
-
-        print("-----------------------------")
-        
-        # --- MODIFIED ---
-        # Print raw JSON for debugging
-        print(f"Raw JSON: {message}")
-
-        fmt = "<i i i b"
-        size = struct.calcsize(fmt)
-        buf = bytearray(size)
-        struct.pack_into(fmt, buf, 0, mode_as_int, hr, sensor_data.get('reps', 'N/A'), sensor_data.get('start', False))
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect(("127.0.0.1", 5555))
-        s.send(buf)
-
-    except json.JSONDecodeError:
-        print(f"Could not decode JSON: {message}")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-
-
-async def main():
-    """Main function to scan, connect, and listen for notifications."""
-    print("Scanning for devices...")
-    device = await BleakScanner.find_device_by_name(DEVICE_NAME)
-
-    if device is None:
-        print(f"Could not find a device named '{DEVICE_NAME}'")
-        return
-
-    print(f"Found device: {device.name} ({device.address})")
-
-    async with BleakClient(device) as client:
-        if client.is_connected:
-            print(f"Connected to {device.name}")
-            
-            # Subscribe to notifications from the characteristic
-            await client.start_notify(CHARACTERISTIC_UUID, notification_handler)
-            print("Subscribed to notifications. Waiting for data...")
-            
-            # Keep the script running to receive notifications
-            while client.is_connected:
-                await asyncio.sleep(1)
-        else:
-            print(f"Failed to connect to {device.name}")
+                lines.append("         Heart Rate: (No finger detected)")
+
+            # Only show reps or "get ready" message in exercise modes
+            if mode_id != HR_ONLY_MODE:
+                if start:
+                    lines.append(f"               Reps: {reps}")
+                else:
+                    # If 'start' is false, it's the "get ready" period
+                    lines.append("\n             >> Get Ready! <<")
+
+            lines.append("-----------------------------")
+            if seq is None:
+                lines.append(f"Raw JSON: {raw.decode('utf-8', 'replace')}")
+            else:
+                lines.append(f"Packet #{seq} @ {timestamp_ms} ms: {raw.hex()}")
+            lines.append("")
+        # ANSI home + clear instead of forking a shell per redraw
+        return "\033[H\033[J" + "\n".join(lines) + "\n"
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.dirty:
+                self.dirty = False
+                sys.stdout.write(self.render())
+                sys.stdout.flush()
+
+
+def make_notification_handler(device, forwarder, view=None, recorder=None):
+    """Builds the BLE callback for one tracker: decode, enqueue, no I/O."""
+
+    def notification_handler(sender: int, data: bytearray):
+        """Handles incoming data from the BLE characteristic."""
+        if recorder is not None:
+            recorder.write(device, data)
+        try:
+            sample = decode_notification(data)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            print(f"[{device}] Could not decode JSON: {bytes(data)!r}")
+            return
+        except (TypeError, ValueError, IndexError) as e:
+            print(f"[{device}] Malformed notification: {e}")
+            return
+
+        forwarder.submit(device, sample)
+        if view is not None:
+            view.update(device, sample, bytes(data))
+
+    return notification_handler
+
+
+class TrackerLink:
+    """Keeps one wearable connected and subscribed, reconnecting with backoff."""
+
+    def __init__(self, device, address, forwarder, view=None, recorder=None):
+        self.device = device
+        self.address = address
+        self.handler = make_notification_handler(device, forwarder, view, recorder)
+        self.connects = 0
+
+    async def run(self):
+        from bleak import BleakClient
+        from bleak.exc import BleakError
+
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            disconnected = asyncio.Event()
+            try:
+                async with BleakClient(self.address, disconnected_callback=lambda _: disconnected.set()) as client:
+                    await client.start_notify(CHARACTERISTIC_UUID, self.handler)
+                    self.connects += 1
+                    delay = RECONNECT_MIN_DELAY
+                    print(f"[{self.device}] Connected to {self.address}, waiting for data...")
+                    await disconnected.wait()
+                print(f"[{self.device}] Disconnected from {self.address}")
+            except (BleakError, OSError, asyncio.TimeoutError) as e:
+                print(f"[{self.device}] Connection to {self.address} failed: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+class TrackerHub:
+    """Serves any number of trackers on one event loop.
+
+    Each tracker gets a TrackerLink and a stable device index (in discovery
+    order) that tags its samples on the way to the relay. All links share a
+    single RelayForwarder.
+    """
+
+    def __init__(self, forwarder, view=None, addresses=(), recorder=None):
+        self.forwarder = forwarder
+        self.view = view
+        self.recorder = recorder
+        self.addresses = list(addresses)
+        self.links = {}  # address -> TrackerLink
+        self.tasks = []
+
+    def add(self, address):
+        if address in self.links:
+            return
+        link = TrackerLink(len(self.links) + 1, address, self.forwarder, self.view, self.recorder)
+        self.links[address] = link
+        self.tasks.append(asyncio.create_task(link.run()))
+        print(f"Tracking device [{link.device}] at {address}")
+
+    async def scan(self):
+        from bleak import BleakScanner
+
+        devices = await BleakScanner.discover(timeout=SCAN_TIMEOUT)
+        for device in devices:
+            if device.name == DEVICE_NAME:
+                self.add(device.address)
+
+    async def run(self):
+        from bleak.exc import BleakError
+
+        for address in self.addresses:
+            self.add(address)
+        try:
+            if self.addresses:
+                # Explicit address list: no discovery needed
+                await asyncio.Future()
+            while True:
+                print("Scanning for devices...")
+                try:
+                    await self.scan()
+                except BleakError as e:
+                    print(f"Scan failed: {e}")
+                if not self.links:
+                    print(f"Could not find a device named '{DEVICE_NAME}'")
+                await asyncio.sleep(RESCAN_INTERVAL)
+        finally:
+            for task in self.tasks:
+                task.cancel()
+
+
+async def main(addresses=(), show_view=True, record_path=None):
+    """Main function to discover trackers and forward their notifications."""
+    forwarder = RelayForwarder()
+    recorder = None
+    if record_path:
+        from telemetry_log import TelemetryRecorder
+        recorder = TelemetryRecorder(record_path)
+        print(f"Recording notifications to {record_path}")
+    view = ConsoleView() if show_view else None
+    tasks = [asyncio.create_task(forwarder.run())]
+    if view is not None:
+        tasks.append(asyncio.create_task(view.run()))
+
+    try:
+        await TrackerHub(forwarder, view, addresses, recorder).run()
+    finally:
+        for task in tasks:
+            task.cancel()
+        if recorder is not None:
+            recorder.close()
+            print(f"Recorded {recorder.records} notifications to {record_path}")
+        print(f"Forwarded {forwarder.sent} samples, dropped {forwarder.dropped}")
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        args = sys.argv[1:]
+        addresses = [arg for arg in args if not arg.startswith('--')]
+        record_path = next((arg.split('=', 1)[1] for arg in args if arg.startswith('--record=')), None)
+        asyncio.run(main(addresses, show_view='--no-view' not in args, record_path=record_path))
     except KeyboardInterrupt:
         print("\nProgram stopped by user.")
@@ -1,37 +1,309 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import json
+import os
 import socket
-import struct
+import sys
+import threading
+import time
+
+import relay_hub
+import shm_ring
+from protocol import BIOMETRICS_FMT, LEGACY_RESULT_FMT
+
+RELAY_HOST = "127.0.0.1"
+BIOMETRICS_PORT = 5557
+RESULT_PORT = 5558
+REFRESH_INTERVAL = 0.02  # seconds between relay polls
+HISTORY_SIZE = 512  # events kept for reconnecting SSE clients
+KEEPALIVE_INTERVAL = 15.0  # seconds of silence before an SSE comment is sent
+BOOT_ID = os.urandom(4).hex()  # keeps ETags from before a restart from matching
+
+
+def recv_exact(sock, size):
+    """Reads exactly size bytes from sock, or raises if the peer closes early."""
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError(f"expected {size} bytes, got {len(buf)}")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def fetch(port, fmt):
+    """One-shot request against a legacy relay port."""
+    with socket.create_connection((RELAY_HOST, port), timeout=1.0) as s:
+        return fmt.unpack(recv_exact(s, fmt.size))
+
+
+class RelayState:
+    """Latest biometrics and AI result, shared by all HTTP handler threads.
+
+    Only the refresher thread talks to the relay, so port 5558 results are
+    consumed exactly once no matter how many dashboards are polling. Every
+    change bumps version, which doubles as the SSE event sequence number.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.history = deque(maxlen=HISTORY_SIZE)  # (seq, event, json bytes)
+        self.version = 0
+        self.biometrics = None
+        self.result = None
+        self.results_seen = 0
+        self.results_stale = 0  # hub results dropped for exceeding the TTL; not in body, which is ETagged by version
+        self.body = b""
+        self.etag = ""
+        self._render()
+
+    def _render(self):
+        state = {
+            "version": self.version,
+            "biometrics": self.biometrics,
+            "result": self.result,
+            "resultsSeen": self.results_seen,
+        }
+        self.body = json.dumps(state, separators=(",", ":")).encode()
+        self.etag = f'"{BOOT_ID}-{self.version}"'
+
+    def _publish(self, event, data):
+        self.version += 1
+        self.history.append((self.version, event, json.dumps(data, separators=(",", ":")).encode()))
+        self._render()
+        self.changed.notify_all()
+
+    def update_biometrics(self, values):
+        mode, hr, reps, start, device = values
+        biometrics = {"device": device, "mode": mode, "hr": hr, "reps": reps, "start": start}
+        with self.lock:
+            if biometrics == self.biometrics:
+                return
+            self.biometrics = biometrics
+            self._publish("biometrics", biometrics)
+
+    def update_result(self, values):
+        """Legacy 5558 result. ai_feedback_t carries no capture stamp, so the
+        timestamp is when it was polled and no TTL can be applied here;
+        rpc_server.cpp ages results from the features' arrival on 5556."""
+        has_value, flag = values
+        if not has_value:
+            return
+        with self.lock:
+            self.results_seen += 1
+            self.result = {"correct": bool(flag), "timestamp": int(time.time() * 1000)}
+            self._publish("result", self.result)
+
+    def update_stamped_result(self, payload, ttl):
+        """Hub result; timestamp is when its camera frame was captured."""
+        seq, captured, flag = relay_hub.RESULT_FMT.unpack(payload)
+        with self.lock:
+            if time.time() - captured > ttl:
+                self.results_stale += 1
+                print(f"Dropped stale result for frame {seq} ({self.results_stale} so far)")
+                return
+            self.results_seen += 1
+            self.result = {"correct": bool(flag), "timestamp": int(captured * 1000), "seq": seq}
+            self._publish("result", self.result)
+
+    def snapshot(self):
+        with self.lock:
+            return self.body, self.etag
+
+    def events_after(self, seq, timeout):
+        """Returns buffered events newer than seq, waiting up to timeout for one.
+
+        If seq has already fallen out of the history ring the oldest retained
+        events are returned; the client sees the gap in the sequence numbers.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.version > seq, timeout)
+            if self.version <= seq:
+                return []
+            return [entry for entry in self.history if entry[0] > seq]
+
+
+def refresh_loop(state, stop_event):
+    """Polls the relay in the background and folds new values into state."""
+    while not stop_event.is_set():
+        try:
+            state.update_biometrics(fetch(BIOMETRICS_PORT, BIOMETRICS_FMT))
+            state.update_result(fetch(RESULT_PORT, LEGACY_RESULT_FMT))
+        except OSError as e:
+            print(f"Relay unavailable: {e}")
+            stop_event.wait(1.0)
+            continue
+        stop_event.wait(REFRESH_INTERVAL)
+
+
+def subscribe_loop(state, stop_event, host, port, ttl=relay_hub.DEFAULT_TTL):
+    """Follows the relay hub's biometrics and result topics instead of polling."""
+    client = relay_hub.HubClient(host, port)
+    client.subscribe(relay_hub.BIOMETRICS, relay_hub.RESULT)
+    while not stop_event.is_set():
+        try:
+            for topic, payload in client.poll(timeout=1.0):
+                if topic == relay_hub.BIOMETRICS:
+                    state.update_biometrics(BIOMETRICS_FMT.unpack(payload))
+                else:
+                    state.update_stamped_result(payload, ttl)
+        except OSError as e:
+            print(f"Relay hub unavailable: {e}")
+            client.close()
+            stop_event.wait(1.0)
+
 
 class MyHandler(BaseHTTPRequestHandler):
+    state = None
+
     def do_GET(self):
-        fmt = "<i i i b"
-        size = struct.calcsize(fmt)
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect(("127.0.0.1", 5557))
-        buffer = s.recv(size)
-        s.close()
-        values = struct.unpack(fmt, buffer)
-
-        fmt2 = "<b b"
-        size2 = struct.calcsize(fmt2)
-        s2 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s2.connect(("127.0.0.1", 5558))
-        buffer2 = s2.recv(size2)
-        s2.close()
-        values2 = struct.unpack(fmt2, buffer2)
+        url = urlsplit(self.path)
+        if url.path == "/events":
+            self.stream_events(url)
+            return
+        if url.path not in ("/", "/state"):
+            self.send_error(404)
+            return
+
+        body, etag = self.state.snapshot()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_events(self, url):
+        """Server-Sent Events stream of biometrics and result updates.
+
+        Clients resume with the standard Last-Event-ID header or ?since=<seq>;
+        a fresh client starts from the current state. ?replay=biometrics,...
+        limits which event types missed before the resume are sent.
+        """
+        query = parse_qs(url.query)
+        resume = self.headers.get("Last-Event-ID") or query.get("since", [None])[0]
+        replay = set(query["replay"][0].split(",")) if "replay" in query else None
+        try:
+            seq = int(resume)
+        except (TypeError, ValueError):
+            seq = None
 
         self.send_response(200)
-        self.send_header("Content-type", "text/html")
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
         self.end_headers()
-        html = f"<html><head><title>Test Page</title></head><body><h1>{values[0]},{values[1]},{values[2]},{values[3]},{values2[0]},{values2[1]}</h1></body></html>".encode()
-        print(html)
-        self.wfile.write(html)
 
-def run(server_class=HTTPServer, handler_class=MyHandler, port=8081):
+        try:
+            with self.state.lock:
+                # A sequence from before a server restart cannot be resumed.
+                if seq is not None and seq > self.state.version:
+                    seq = None
+                if seq is None:
+                    seq = self.state.version
+                    body = self.state.body
+                else:
+                    body = None
+                replayed = self.state.version  # events up to here were missed, not live
+            if body is not None:
+                self.wfile.write(b"id: %d\nevent: state\ndata: %s\n\n" % (seq, body))
+                self.wfile.flush()
+            while True:
+                events = self.state.events_after(seq, KEEPALIVE_INTERVAL)
+                if replay is not None and events and events[0][0] <= replayed:
+                    seq = max(seq, min(replayed, events[-1][0]))
+                    events = [entry for entry in events if entry[0] > replayed or entry[1] in replay]
+                if not events:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    self.wfile.write(b"".join(
+                        b"id: %d\nevent: %s\ndata: %s\n\n" % (event_seq, event.encode(), data)
+                        for event_seq, event, data in events
+                    ))
+                    seq = max(seq, events[-1][0])
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def shm_loop(state, stop_event, ttl=relay_hub.DEFAULT_TTL):
+    """Follows the shared-memory rings of a local relay_hub.py --shm."""
+    readers = None
+    while not stop_event.is_set():
+        if readers is None:
+            try:
+                readers = {
+                    topic: shm_ring.RingReader(shm_ring.ring_name(relay_hub.TOPIC_NAMES[topic]))
+                    for topic in (relay_hub.BIOMETRICS, relay_hub.RESULT)
+                }
+            except FileNotFoundError as e:
+                print(f"Relay hub rings unavailable: {e}")
+                stop_event.wait(1.0)
+                continue
+            latest = readers[relay_hub.BIOMETRICS].latest()
+            if latest is not None:
+                state.update_biometrics(BIOMETRICS_FMT.unpack(latest[1]))
+        for _, payload in readers[relay_hub.BIOMETRICS].read_new():
+            state.update_biometrics(BIOMETRICS_FMT.unpack(payload))
+        for _, payload in readers[relay_hub.RESULT].read_new():
+            state.update_stamped_result(payload, ttl)
+        stop_event.wait(REFRESH_INTERVAL)
+
+
+def run(server_class=ThreadingHTTPServer, handler_class=MyHandler, port=8081, hub=None,
+        ttl=relay_hub.DEFAULT_TTL, shm=False):
+    """hub is a (host, port) of relay_hub.py to subscribe to; None polls 5557/5558.
+
+    shm reads a local hub's shared-memory rings instead of either socket.
+    ttl is how old (seconds since capture) a hub result may be when shown.
+    """
+    state = RelayState()
+    stop_event = threading.Event()
+    if shm:
+        refresher = threading.Thread(target=shm_loop, args=(state, stop_event, ttl), daemon=True)
+    elif hub is not None:
+        refresher = threading.Thread(target=subscribe_loop, args=(state, stop_event, *hub, ttl), daemon=True)
+    else:
+        refresher = threading.Thread(target=refresh_loop, args=(state, stop_event), daemon=True)
+    refresher.start()
+
+    handler_class.state = state
     server_address = ('', port)
     httpd = server_class(server_address, handler_class)
-    print(f"Serving custom HTML at http://localhost:{port}")
-    httpd.serve_forever()
+    httpd.daemon_threads = True
+    print(f"Serving relay state as JSON at http://localhost:{port}/state")
+    print(f"Streaming relay updates (SSE) at http://localhost:{port}/events")
+    try:
+        httpd.serve_forever()
+    finally:
+        stop_event.set()
+        httpd.server_close()
 
 if __name__ == "__main__":
-    run()
+    hub = None
+    ttl = relay_hub.DEFAULT_TTL
+    shm = False
+    for arg in sys.argv[1:]:
+        if arg == "--hub":
+            hub = (relay_hub.HUB_HOST, relay_hub.HUB_PORT)
+        elif arg.startswith("--hub="):
+            host, _, hub_port = arg.split("=", 1)[1].rpartition(":")
+            hub = (host or relay_hub.HUB_HOST, int(hub_port))
+        elif arg.startswith("--ttl="):
+            ttl = float(arg.split("=", 1)[1])
+        elif arg == "--shm":
+            shm = True
+    run(hub=hub, ttl=ttl, shm=shm)
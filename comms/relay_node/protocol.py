@@ -0,0 +1,59 @@
+"""Binary wire formats shared by the relay node's Python endpoints.
+
+Record codecs are precompiled struct.Structs laid out like the C structs
+in rpc/rpc_server.cpp, so every script packs and unpacks them the same
+way. Feature records are float32, packed from and unpacked into NumPy
+arrays through memoryview without per-value Python conversions.
+
+relay_hub.py connections carry frames of
+
+    uint32 payload length | uint8 op | uint8 topic | payload
+
+where FEATURES and RESULT payloads start with a stamp, the sequence
+number and capture time (time.time()) of the camera frame they describe.
+The legacy one-shot ports and rpc_server.cpp use the bare records.
+"""
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # only the feature helpers need NumPy
+    np = None
+
+# Record types; the values double as relay_hub.py topic ids
+BIOMETRICS = 1
+FEATURES = 2
+RESULT = 3
+
+FEATURE_COUNT = 59
+BIOMETRICS_FMT = struct.Struct("<i i i ? 3x i")  # data_t: mode, hr, reps, start, device
+FEATURES_FMT = struct.Struct(f"<{FEATURE_COUNT}f")  # image_data_t
+RESULT_FMT = struct.Struct("<?")  # classifier verdict
+PREDICTION_FMT = struct.Struct("<f")  # raw classifier output
+LEGACY_RESULT_FMT = struct.Struct("<b b")  # ai_feedback_t: has_value, flag
+FEATURE_DTYPE = "<f4"
+
+# relay_hub.py framing
+FRAME_HEADER = struct.Struct("<I B B")  # payload length, op, topic
+SUBSCRIBE = 1
+PUBLISH = 2
+STAMP = struct.Struct("<I 4x d")  # sequence, capture time
+STAMPED_FEATURES_FMT = struct.Struct(STAMP.format + " " + FEATURES_FMT.format.lstrip("<"))
+STAMPED_RESULT_FMT = struct.Struct(STAMP.format + " " + RESULT_FMT.format.lstrip("<"))
+
+
+def encode_frame(op, topic, payload=b""):
+    return FRAME_HEADER.pack(len(payload), op, topic) + payload
+
+
+def feature_buffer(features):
+    """Byte view of one vector or a (n, 59) batch, copying only if needed"""
+    array = np.ascontiguousarray(features, dtype=FEATURE_DTYPE)
+    if array.size % FEATURE_COUNT:
+        raise ValueError(f"{array.size} values is not a whole number of feature vectors")
+    return memoryview(array).cast("B")
+
+
+def decode_features(records):
+    """(n, 59) float32 array viewing records; no copy"""
+    return np.frombuffer(records, dtype=FEATURE_DTYPE).reshape(-1, FEATURE_COUNT)
@@ -0,0 +1,475 @@
+"""Topic-based publish/subscribe hub for the relay node.
+
+Replaces the connect-per-message ports of rpc/rpc_server.cpp with one
+persistent TCP connection per client. Every message is a frame (see
+protocol.py)
+
+    uint32 payload length | uint8 op | uint8 topic | payload
+
+Clients send SUBSCRIBE (empty payload; the hub replies with the topic's
+latest value, if any) and PUBLISH; the hub forwards each PUBLISH to every
+subscriber of the topic. Payloads keep the layouts of the legacy ports:
+
+    BIOMETRICS  data_t, "<i i i ? 3x i"   (mode, hr, reps, start, device)
+    FEATURES    stamp + 59 float32
+    RESULT      stamp + "<?"              classifier verdict
+
+A stamp is the sequence number and capture time (time.time()) of the
+camera frame the features came from; the classifier copies it into its
+result. Features and results older than the TTL are dropped when they are
+published and again when they are dequeued, so late feedback is never
+shown for a rep the user has already finished.
+
+Unless --no-legacy is given the hub also speaks the old one-shot protocol
+on ports 5555-5558, so the BLE receiver, the dashboard poller and other
+unmodified peers keep working while they migrate. With --rpc HOST the hub
+instead runs alongside rpc/rpc_server.cpp, which keeps those ports: the
+hub's FEATURES go to its port 5556, where the FPGA's rpc_client picks them
+up over RPC port 3000, and the verdicts it returns on 5558 (and the
+biometrics on 5557) are published back to the hub. With --shm every
+accepted payload is also appended to a shared-memory ring per topic (see
+shm_ring.py), which processes on this host can read without a socket.
+"""
+import argparse
+import asyncio
+import socket
+import time
+from collections import deque
+
+import protocol
+import shm_ring
+from protocol import (
+    BIOMETRICS, BIOMETRICS_FMT, FEATURES, FRAME_HEADER, LEGACY_RESULT_FMT, PUBLISH, RESULT, STAMP, SUBSCRIBE,
+    encode_frame,
+)
+
+HUB_HOST = "127.0.0.1"
+HUB_PORT = 5560
+
+TOPIC_NAMES = {BIOMETRICS: "biometrics", FEATURES: "features", RESULT: "result"}
+
+# Stamped topics carry (frame sequence, capture time) before the record
+FEATURES_FMT = protocol.STAMPED_FEATURES_FMT
+RESULT_FMT = protocol.STAMPED_RESULT_FMT
+STAMPED_TOPICS = (FEATURES, RESULT)
+DEFAULT_TTL = 1.0  # seconds a feature vector or result stays useful
+TOPIC_SIZES = {BIOMETRICS: BIOMETRICS_FMT.size, FEATURES: FEATURES_FMT.size, RESULT: RESULT_FMT.size}
+
+# Legacy one-shot ports (rpc_server.cpp)
+LEGACY_BIOMETRICS_IN = 5555
+LEGACY_FEATURES_IN = 5556
+LEGACY_BIOMETRICS_OUT = 5557
+LEGACY_RESULT_OUT = 5558
+LEGACY_BIOMETRICS_MIN = 13  # bytes up to and including data_t.start
+LEGACY_FEATURES_FMT = protocol.FEATURES_FMT
+
+LEGACY_RESULT_QUEUE = 64  # results kept for port 5558 pollers
+RPC_POLL_INTERVAL = 0.02  # seconds between rpc_server 5557/5558 polls when idle
+RPC_RETRY_INTERVAL = 1.0  # seconds before retrying an unreachable rpc_server
+MAX_SUBSCRIBER_BUFFER = 256 * 1024  # bytes queued for a subscriber before frames are dropped
+STATS_INTERVAL = 10.0  # seconds between drop counter reports
+
+
+def is_stale(payload, ttl, now=None):
+    """Whether a stamped payload was captured more than ttl seconds ago"""
+    _, captured = STAMP.unpack_from(payload)
+    return (time.time() if now is None else now) - captured > ttl
+
+
+async def read_up_to(reader, size):
+    """Reads size bytes, or fewer if the peer closes first."""
+    data = b""
+    while len(data) < size:
+        chunk = await reader.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class RelayHub:
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.subscribers = {topic: set() for topic in TOPIC_NAMES}  # topic -> StreamWriters
+        self.latest = {}  # topic -> last payload
+        self.legacy_results = deque(maxlen=LEGACY_RESULT_QUEUE)
+        self.legacy_sequence = 0  # stamps legacy port 5556 input
+        self.published = dict.fromkeys(TOPIC_NAMES, 0)
+        self.stale_on_publish = dict.fromkeys(STAMPED_TOPICS, 0)
+        self.stale_on_dequeue = 0  # results expired in the legacy 5558 queue
+        self.dropped = 0  # frames not delivered to slow subscribers
+        self.rings = {}  # topic -> shm_ring.RingWriter, with --shm
+        self.bridge = None  # RpcBridge, with --rpc
+
+    def enable_shm(self, capacity=shm_ring.DEFAULT_CAPACITY):
+        for topic, name in TOPIC_NAMES.items():
+            self.rings[topic] = shm_ring.RingWriter(shm_ring.ring_name(name), TOPIC_SIZES[topic], capacity)
+        print(f"Shared-memory rings: {', '.join(ring.name for ring in self.rings.values())}")
+
+    def close_shm(self):
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()
+
+    def stats(self):
+        return {
+            "published": {TOPIC_NAMES[t]: n for t, n in self.published.items()},
+            "staleOnPublish": {TOPIC_NAMES[t]: n for t, n in self.stale_on_publish.items()},
+            "staleOnDequeue": self.stale_on_dequeue,
+            "slowSubscriberDrops": self.dropped,
+            **(self.bridge.stats() if self.bridge is not None else {}),
+        }
+
+    async def report_stats(self):
+        last = None
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            stats = self.stats()
+            if stats != last:
+                print(f"Hub stats: {stats}")
+                last = stats
+
+    def publish(self, topic, payload):
+        if topic in STAMPED_TOPICS and is_stale(payload, self.ttl):
+            self.stale_on_publish[topic] += 1
+            return
+        self.latest[topic] = payload
+        self.published[topic] += 1
+        ring = self.rings.get(topic)
+        if ring is not None:
+            ring.write(payload)
+        if topic == RESULT:
+            self.legacy_results.append(payload)
+        elif topic == FEATURES and self.bridge is not None:
+            self.bridge.forward(payload)
+        frame = encode_frame(PUBLISH, topic, payload)
+        for writer in self.subscribers[topic]:
+            if writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                self.dropped += 1
+                continue
+            writer.write(frame)
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        print(f"Hub client connected: {peer}")
+        try:
+            while True:
+                length, op, topic = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                payload = await reader.readexactly(length) if length else b""
+                if topic not in TOPIC_NAMES:
+                    print(f"Hub: unknown topic {topic} from {peer}")
+                elif op == SUBSCRIBE:
+                    self.subscribers[topic].add(writer)
+                    if topic in self.latest:
+                        writer.write(encode_frame(PUBLISH, topic, self.latest[topic]))
+                elif op == PUBLISH:
+                    if length != TOPIC_SIZES[topic]:
+                        print(f"Hub: {TOPIC_NAMES[topic]} payload of {length} bytes from {peer}, expected {TOPIC_SIZES[topic]}")
+                        continue
+                    self.publish(topic, payload)
+                else:
+                    print(f"Hub: unknown op {op} from {peer}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for subscribers in self.subscribers.values():
+                subscribers.discard(writer)
+            writer.close()
+            print(f"Hub client disconnected: {peer}")
+
+    # ------------------------------------------------------------------
+    # Legacy one-shot ports
+    # ------------------------------------------------------------------
+
+    async def legacy_biometrics_in(self, reader, writer):
+        # Persistent senders stream data_t back to back; one-shot senders
+        # send a single, possibly unpadded, packet and close.
+        try:
+            while True:
+                packet = await read_up_to(reader, BIOMETRICS_FMT.size)
+                if len(packet) < LEGACY_BIOMETRICS_MIN:
+                    break
+                self.publish(BIOMETRICS, packet.ljust(BIOMETRICS_FMT.size, b"\0"))
+                if len(packet) < BIOMETRICS_FMT.size:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def legacy_features_in(self, reader, writer):
+        try:
+            packet = await read_up_to(reader, LEGACY_FEATURES_FMT.size)
+            if len(packet) == LEGACY_FEATURES_FMT.size:
+                # Legacy senders carry no stamp; arrival is the best estimate
+                self.legacy_sequence += 1
+                self.publish(FEATURES, STAMP.pack(self.legacy_sequence, time.time()) + packet)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def legacy_biometrics_out(self, reader, writer):
+        writer.write(self.latest.get(BIOMETRICS, bytes(BIOMETRICS_FMT.size)))
+        await self._close(writer)
+
+    async def legacy_result_out(self, reader, writer):
+        # Each poll consumes one fresh result, as with rpc_server.cpp's result_queue
+        now = time.time()
+        while self.legacy_results and is_stale(self.legacy_results[0], self.ttl, now):
+            self.legacy_results.popleft()
+            self.stale_on_dequeue += 1
+        if self.legacy_results:
+            _, _, flag = RESULT_FMT.unpack(self.legacy_results.popleft())
+            writer.write(LEGACY_RESULT_FMT.pack(1, flag))
+        else:
+            writer.write(LEGACY_RESULT_FMT.pack(0, 0))
+        await self._close(writer)
+
+    @staticmethod
+    async def _close(writer):
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def serve(self, host, port, legacy=True, legacy_host="0.0.0.0"):
+        servers = [await asyncio.start_server(self.handle_client, host, port)]
+        print(f"Relay hub listening on {host}:{port} (TTL {self.ttl}s)")
+        tasks = [self.report_stats()]
+        if self.bridge is not None:
+            tasks.append(self.bridge.run())
+        if legacy:
+            for legacy_port, handler in (
+                (LEGACY_BIOMETRICS_IN, self.legacy_biometrics_in),
+                (LEGACY_FEATURES_IN, self.legacy_features_in),
+                (LEGACY_BIOMETRICS_OUT, self.legacy_biometrics_out),
+                (LEGACY_RESULT_OUT, self.legacy_result_out),
+            ):
+                servers.append(await asyncio.start_server(handler, legacy_host, legacy_port))
+            print(f"Legacy one-shot ports {LEGACY_BIOMETRICS_IN}-{LEGACY_RESULT_OUT} enabled")
+        await asyncio.gather(*tasks, *(server.serve_forever() for server in servers))
+
+
+class RpcBridge:
+    """Runs the hub's features through rpc_server.cpp and publishes its verdicts.
+
+    rpc_server.cpp queues vectors from port 5556 for the FPGA and hands
+    back verdicts on 5558, oldest first and without their input. Vectors
+    are sent one at a time so the queue keeps their order, and each
+    verdict gets the stamp of the oldest vector still pending. Pending
+    vectors older than the TTL are forgotten, as rpc_server drops them
+    too; a mode 0 on 5557 (which empties its queue) forgets all of them.
+    """
+
+    def __init__(self, hub, host):
+        self.hub = hub
+        self.host = host
+        self.outgoing = asyncio.Queue()
+        self.pending = deque()  # (monotonic time sent, stamp) awaiting a verdict
+        self.forwarded = 0
+        self.stale = 0  # features that expired waiting to be sent
+        self.unmatched = 0  # verdicts with no pending stamp, not published
+        self.reachable = True
+
+    def stats(self):
+        return {
+            "rpcForwarded": self.forwarded,
+            "rpcStale": self.stale,
+            "rpcPending": len(self.pending),
+            "rpcUnmatched": self.unmatched,
+        }
+
+    def forward(self, payload):
+        self.outgoing.put_nowait(payload)
+
+    async def run(self):
+        print(f"Forwarding features to rpc_server on {self.host}:{LEGACY_FEATURES_IN}")
+        await asyncio.gather(self.send_features(), self.poll())
+
+    async def request(self, port, send=b"", size=0):
+        """One-shot exchange with an rpc_server port"""
+        reader, writer = await asyncio.open_connection(self.host, port)
+        try:
+            if send:
+                writer.write(send)
+                await writer.drain()
+            return await reader.readexactly(size) if size else b""
+        finally:
+            writer.close()
+
+    async def send_features(self):
+        while True:
+            payload = await self.outgoing.get()
+            if is_stale(payload, self.hub.ttl):
+                self.stale += 1
+                continue
+            try:
+                await self.request(LEGACY_FEATURES_IN, payload[STAMP.size:])
+            except OSError as e:
+                self.unreachable(e)
+                continue
+            self.pending.append((time.monotonic(), payload[:STAMP.size]))
+            self.forwarded += 1
+
+    async def poll(self):
+        last_biometrics = None
+        while True:
+            try:
+                biometrics = await self.request(LEGACY_BIOMETRICS_OUT, size=BIOMETRICS_FMT.size)
+                has_value, flag = LEGACY_RESULT_FMT.unpack(
+                    await self.request(LEGACY_RESULT_OUT, size=LEGACY_RESULT_FMT.size))
+            except (OSError, asyncio.IncompleteReadError) as e:
+                self.unreachable(e)
+                await asyncio.sleep(RPC_RETRY_INTERVAL)
+                continue
+            self.reachable = True
+            if biometrics != last_biometrics:
+                last_biometrics = biometrics
+                if BIOMETRICS_FMT.unpack(biometrics)[0] == 0:
+                    self.pending.clear()
+                self.hub.publish(BIOMETRICS, biometrics)
+            if has_value:
+                self.on_result(bool(flag))
+            else:
+                await asyncio.sleep(RPC_POLL_INTERVAL)
+
+    def on_result(self, flag):
+        expired = time.monotonic() - self.hub.ttl
+        while self.pending and self.pending[0][0] < expired:
+            self.pending.popleft()
+        if not self.pending:
+            self.unmatched += 1
+            return
+        _, stamp = self.pending.popleft()
+        self.hub.publish(RESULT, stamp + protocol.RESULT_FMT.pack(flag))
+
+    def unreachable(self, error):
+        if self.reachable:
+            print(f"rpc_server on {self.host} unavailable: {error}")
+        self.reachable = False
+
+
+class HubClient:
+    """Blocking hub client for scripts and threads.
+
+    Keeps one connection open, re-subscribes after reconnecting, and keeps
+    the newest payload per subscribed topic in latest.
+    """
+
+    def __init__(self, host=HUB_HOST, port=HUB_PORT, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = bytearray()
+        self.topics = set()
+        self.latest = {}
+
+    def connect(self):
+        self.close()
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.topics:
+            self.sock.sendall(b"".join(encode_frame(SUBSCRIBE, topic) for topic in self.topics))
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.buffer.clear()
+
+    def subscribe(self, *topics):
+        self.topics.update(topics)
+        if self.sock is not None:
+            self.sock.sendall(b"".join(encode_frame(SUBSCRIBE, topic) for topic in topics))
+
+    def publish(self, topic, payload):
+        """Sends one frame, reconnecting once if the connection dropped."""
+        frame = encode_frame(PUBLISH, topic, payload)
+        for attempt in range(2):
+            try:
+                if self.sock is None:
+                    self.connect()
+                self.sock.sendall(frame)
+                return
+            except OSError:
+                self.close()
+                if attempt:
+                    raise
+
+    def poll(self, timeout=0.0):
+        """Returns the (topic, payload) frames received within timeout.
+
+        Waits up to timeout for the first frame, then drains whatever else
+        has already arrived without blocking.
+        """
+        if self.sock is None:
+            self.connect()
+        frames = []
+        self.sock.settimeout(timeout)
+        try:
+            while True:
+                frame = self._next_frame()
+                if frame is not None:
+                    frames.append(frame)
+                    self.latest[frame[0]] = frame[1]
+                    self.sock.settimeout(0.0)
+                    continue
+                chunk = self.sock.recv(65536)
+                if not chunk:
+                    self.close()
+                    raise ConnectionError("relay hub closed the connection")
+                self.buffer += chunk
+        except (BlockingIOError, socket.timeout):
+            pass
+        finally:
+            if self.sock is not None:
+                self.sock.settimeout(self.timeout)
+        return frames
+
+    def _next_frame(self):
+        if len(self.buffer) < FRAME_HEADER.size:
+            return None
+        length, op, topic = FRAME_HEADER.unpack_from(self.buffer)
+        end = FRAME_HEADER.size + length
+        if len(self.buffer) < end:
+            return None
+        payload = bytes(self.buffer[FRAME_HEADER.size:end])
+        del self.buffer[:end]
+        return topic, payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay node publish/subscribe hub")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=HUB_PORT)
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL,
+                        help="seconds after capture that features and results are dropped")
+    parser.add_argument("--no-legacy", action="store_true",
+                        help="do not serve the one-shot ports 5555-5558 (e.g. when rpc_server still owns them)")
+    parser.add_argument("--rpc", metavar="HOST",
+                        help="classify features through rpc_server.cpp on HOST (ports 5556-5558, "
+                             "the FPGA's RPC path) and publish its verdicts; implies --no-legacy")
+    parser.add_argument("--shm", action="store_true",
+                        help="also publish every topic to shared-memory rings for local readers")
+    args = parser.parse_args()
+    hub = RelayHub(args.ttl)
+    if args.rpc:
+        hub.bridge = RpcBridge(hub, args.rpc)
+    if args.shm:
+        hub.enable_shm()
+    try:
+        asyncio.run(hub.serve(args.host, args.port, legacy=not (args.no_legacy or args.rpc)))
+    except KeyboardInterrupt:
+        print("Relay hub stopped.")
+    finally:
+        hub.close_shm()
+
+
+if __name__ == "__main__":
+    main()
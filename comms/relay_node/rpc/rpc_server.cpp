@@ -2,27 +2,66 @@
 
 #include <arpa/inet.h> // For htons, INADDR_ANY
 #include <array>
+#include <atomic>
+#include <cerrno>
+#include <chrono>
+#include <cstddef> // For offsetof
+#include <cstdint>
+#include <cstdlib> // For getenv
 #include <cstring> // For memset
 #include <iostream>
 #include <mutex>
 #include <netinet/in.h> // For sockaddr_in
+#include <netinet/tcp.h> // For TCP_KEEPIDLE
 #include <queue>
 #include <sys/socket.h>
 #include <sys/types.h>
 #include <thread>
+#include <tuple>
 #include <unistd.h> // For close(), read(), write()
 
+using relay_clock = std::chrono::steady_clock;
+
+// Feature vectors and results older than this are dropped; RELAY_TTL_MS
+// overrides it. Late feedback belongs to a rep the user already finished.
+// The legacy ports carry no capture stamp, so ages count from a vector's
+// arrival on 5556, and ai_feedback_t on 5558 has no time or sequence for
+// pollers to apply a TTL of their own; relay_hub.py's topics are stamped.
+std::chrono::milliseconds stale_ttl(1000);
+
+// Trackers only notify on a change, so a resting user's sender can be
+// silent for minutes. Dead senders are found with TCP keepalive probes
+// instead of a receive timeout: idle seconds, probe interval, probe count.
+constexpr int BIOMETRICS_KEEPALIVE_IDLE_S = 60;
+constexpr int BIOMETRICS_KEEPALIVE_INTERVAL_S = 10;
+constexpr int BIOMETRICS_KEEPALIVE_PROBES = 3;
+
 struct data_t {
   int mode = 0;
   int hr = 0;
   int reps = 0;
   bool start = false;
+  int device = 0; // tracker index from the BLE hub, 0 for legacy senders
 };
 
 struct image_data_t {
   float data[59];
 };
 
+// A feature vector with the sequence number and time it arrived on 5556
+struct queued_image_t {
+  image_data_t image;
+  uint32_t seq = 0;
+  relay_clock::time_point received;
+};
+
+// A classifier verdict, stamped with the input it was computed from
+struct queued_result_t {
+  bool flag = false;
+  uint32_t seq = 0;
+  relay_clock::time_point captured;
+};
+
 struct ai_feedback_t {
   bool has_value = false;
   bool flag = false;
@@ -32,25 +71,59 @@ std::mutex biometrics_data_mutex;
 data_t biometrics_data;
 
 std::mutex image_data_queue_mutex;
-std::queue<image_data_t> image_data_queue;
+std::queue<queued_image_t> image_data_queue;
+uint32_t next_image_seq = 0;
+queued_image_t last_served_image; // most recent get_img_data, for put_result
 
 std::mutex result_queue_mutex;
-std::queue<bool> result_queue;
+std::queue<queued_result_t> result_queue;
+
+std::atomic<uint64_t> stale_inputs{0};
+std::atomic<uint64_t> stale_results{0};
+
+bool is_stale(relay_clock::time_point stamp, relay_clock::time_point now) {
+  return now - stamp > stale_ttl;
+}
+
+// Drops expired feature vectors; image_data_queue_mutex must be held.
+void prune_stale_images(relay_clock::time_point now) {
+  while (!image_data_queue.empty() &&
+         is_stale(image_data_queue.front().received, now)) {
+    image_data_queue.pop();
+    stale_inputs++;
+  }
+}
+
+// Drops expired results; result_queue_mutex must be held.
+void prune_stale_results(relay_clock::time_point now) {
+  while (!result_queue.empty() &&
+         is_stale(result_queue.front().captured, now)) {
+    result_queue.pop();
+    stale_results++;
+  }
+}
 
 void rpc_server() {
   rpc::server srv(3000);
 
   srv.bind("img_qlen", []() {
     image_data_queue_mutex.lock();
+    prune_stale_images(relay_clock::now());
     auto size = image_data_queue.size();
     image_data_queue_mutex.unlock();
     return size;
   });
 
+  // Not pruned here: the client has just seen a non-zero img_qlen and
+  // expects an entry, and the TTL is checked again when the result arrives.
   srv.bind("get_img_data", []() {
+    image_data_t front{};
     image_data_queue_mutex.lock();
-    auto front = image_data_queue.front();
-    image_data_queue.pop();
+    if (!image_data_queue.empty()) {
+      last_served_image = image_data_queue.front();
+      front = last_served_image.image;
+      image_data_queue.pop();
+    }
     image_data_queue_mutex.unlock();
     std::array<char, sizeof(image_data_t)> raw_bytes;
     for (size_t i = 0; i < sizeof(image_data_t); i++) {
@@ -61,10 +134,26 @@ void rpc_server() {
   });
 
   srv.bind("put_result", [](bool result) {
+    queued_result_t entry;
+    entry.flag = result;
+    image_data_queue_mutex.lock();
+    entry.seq = last_served_image.seq;
+    entry.captured = last_served_image.received;
+    image_data_queue_mutex.unlock();
+
+    auto now = relay_clock::now();
+    if (is_stale(entry.captured, now)) {
+      stale_results++;
+      std::cout << "STALE PREDICTION for input " << entry.seq << " dropped ("
+                << stale_results << " results, " << stale_inputs
+                << " inputs dropped so far)\n";
+      return;
+    }
     result_queue_mutex.lock();
-    result_queue.push(result);
+    prune_stale_results(now);
+    result_queue.push(entry);
     result_queue_mutex.unlock();
-    std::cout << "PREDICTION=";
+    std::cout << "PREDICTION[" << entry.seq << "]=";
     if (result) {
       std::cout << "true";
     } else {
@@ -73,11 +162,80 @@ void rpc_server() {
     std::cout << "\n";
   });
 
+  // (stale inputs, stale results) dropped since startup
+  srv.bind("drop_stats", []() {
+    return std::make_tuple(stale_inputs.load(), stale_results.load());
+  });
+
   std::cout << "Starting RPC server on port 3000...\n";
 
   srv.run();
 }
 
+// Reads until len bytes arrived or the peer closed; returns bytes read or -1.
+ssize_t read_full(int fd, void *buf, size_t len) {
+  size_t total = 0;
+  while (total < len) {
+    ssize_t n = read(fd, static_cast<char *>(buf) + total, len - total);
+    if (n < 0) {
+      if (errno == EINTR) {
+        continue;
+      }
+      return -1;
+    }
+    if (n == 0) {
+      break;
+    }
+    total += n;
+  }
+  return total;
+}
+
+void handle_biometrics_packet(const data_t &packet) {
+  biometrics_data_mutex.lock();
+  biometrics_data = packet;
+  if (biometrics_data.mode == 0) {
+      image_data_queue_mutex.lock();
+      while (image_data_queue.size() > 0) {
+        image_data_queue.pop();
+      }
+      image_data_queue_mutex.unlock();
+  }
+  biometrics_data_mutex.unlock();
+  if (packet.start) {
+    std::cout << "device: " << packet.device << ", mode: " << packet.mode
+              << ", hr: " << packet.hr << ", reps: " << packet.reps
+              << ", start: true\n";
+  } else {
+    std::cout << "device: " << packet.device << ", mode: " << packet.mode
+              << ", hr: " << packet.hr << ", reps: " << packet.reps
+              << ", start: false\n";
+  }
+}
+
+// Clients may keep the connection open and stream packets back to back.
+// A legacy one-shot client sends a single (possibly unpadded) packet and
+// closes, which shows up as a short final read.
+void serve_biometrics_client(int client_fd) {
+  for (;;) {
+    data_t packet;
+    ssize_t bytes_read = read_full(client_fd, &packet, sizeof(data_t));
+    if (bytes_read < 0) {
+      perror("read");
+      break;
+    }
+    if (bytes_read < static_cast<ssize_t>(offsetof(data_t, start) + 1)) {
+      break;
+    }
+    handle_biometrics_packet(packet);
+    if (bytes_read < static_cast<ssize_t>(sizeof(data_t))) {
+      break;
+    }
+  }
+
+  close(client_fd);
+}
+
 void esp_receive_server() {
   int port = 5555;
 
@@ -130,31 +288,23 @@ void esp_receive_server() {
     // std::cout << "Accepted connection from " << client_ip << ", port " <<
     // ntohs(cli_addr.sin_port) << "\n";
 
-    data_t packet;
-    ssize_t bytes_read = read(client_fd, &packet, sizeof(data_t));
-    if (bytes_read < 0) {
-      perror("read");
-    } else {
-      biometrics_data_mutex.lock();
-      biometrics_data = packet;
-      if (biometrics_data.mode == 0) {
-          image_data_queue_mutex.lock();
-          while (image_data_queue.size() > 0) {
-            image_data_queue.pop();
-          }
-          image_data_queue_mutex.unlock();
-      }
-      biometrics_data_mutex.unlock();
-      if (packet.start) {
-        std::cout << "mode: " << packet.mode << ", hr: " << packet.hr
-                  << ", reps: " << packet.reps << ", start: true\n";
-      } else {
-        std::cout << "mode: " << packet.mode << ", hr: " << packet.hr
-                  << ", reps: " << packet.reps << ", start: false\n";
-      }
+    // Persistent senders (the BLE forwarder) never close, so each client
+    // gets its own thread and the port keeps accepting.
+    int keepalive = 1;
+    if (setsockopt(client_fd, SOL_SOCKET, SO_KEEPALIVE, &keepalive,
+                   sizeof(keepalive)) < 0) {
+      perror("setsockopt");
     }
-
-    close(client_fd);
+#ifdef TCP_KEEPIDLE
+    int idle = BIOMETRICS_KEEPALIVE_IDLE_S;
+    int interval = BIOMETRICS_KEEPALIVE_INTERVAL_S;
+    int probes = BIOMETRICS_KEEPALIVE_PROBES;
+    setsockopt(client_fd, IPPROTO_TCP, TCP_KEEPIDLE, &idle, sizeof(idle));
+    setsockopt(client_fd, IPPROTO_TCP, TCP_KEEPINTVL, &interval,
+               sizeof(interval));
+    setsockopt(client_fd, IPPROTO_TCP, TCP_KEEPCNT, &probes, sizeof(probes));
+#endif
+    std::thread(serve_biometrics_client, client_fd).detach();
   }
 }
 
@@ -215,8 +365,13 @@ void obs_receive_server() {
     if (bytes_read < 0) {
       perror("read");
     } else {
+      queued_image_t entry;
+      entry.image = packet;
+      entry.received = relay_clock::now();
       image_data_queue_mutex.lock();
-      image_data_queue.push(packet);
+      prune_stale_images(entry.received);
+      entry.seq = ++next_image_seq;
+      image_data_queue.push(entry);
       image_data_queue_mutex.unlock();
       /*
       std::cout << "\nRECEIVED IMAGE DATA PACKET\n";
@@ -349,11 +504,12 @@ void visualizer_ai_feedback_server() {
 
     ai_feedback_t result_struct{};
     result_queue_mutex.lock();
+    prune_stale_results(relay_clock::now());
     if (result_queue.size() > 0) {
       auto result = result_queue.front();
       result_queue.pop();
       result_struct.has_value = true;
-      result_struct.flag = result;
+      result_struct.flag = result.flag;
     } else {
       result_struct.has_value = false;
     }
@@ -369,6 +525,11 @@ void visualizer_ai_feedback_server() {
 }
 
 int main() {
+  if (const char *ttl_ms = std::getenv("RELAY_TTL_MS")) {
+    stale_ttl = std::chrono::milliseconds(std::atoi(ttl_ms));
+  }
+  std::cout << "Dropping inputs and results older than " << stale_ttl.count()
+            << " ms\n";
   std::thread t1(rpc_server);
   std::thread t2(esp_receive_server);
   std::thread t3(obs_receive_server);
@@ -0,0 +1,153 @@
+"""Shared-memory ring buffers for relay processes on the same host.
+
+One writer (relay_hub.py --shm) appends fixed-size records to a ring per
+topic; any number of readers attach by name and either take the newest
+record or follow the stream, without a socket or a syscall per record.
+Peers on other hosts keep using the hub's TCP port.
+
+Layout of a ring, all little endian:
+
+    header  uint64 head (records written) | uint32 record size | uint32 capacity
+    slot i  uint64 sequence | record, padded to 8 bytes
+
+Each slot is a seqlock: the writer marks it odd (2n - 1) while copying
+record n in and even (2n) when done, then advances head. A reader that
+sees the same even sequence before and after copying got a consistent
+record; otherwise the writer lapped it and the record is skipped.
+"""
+from multiprocessing import resource_tracker, shared_memory
+import struct
+
+RING_HEADER = struct.Struct("<Q I I")  # head, record size, capacity
+SLOT_SEQ = struct.Struct("<Q")
+HEADER_SIZE = 64  # header padded to a cache line
+DEFAULT_CAPACITY = 256  # records kept per ring
+READ_RETRIES = 3  # attempts at a slot the writer is rewriting
+
+_created = set()  # segments this process's RingWriters own
+
+
+def ring_name(topic_name):
+    return f"fitness-relay-{topic_name}"
+
+
+def slot_size(record_size):
+    return SLOT_SEQ.size + (record_size + 7) // 8 * 8
+
+
+def attach(name):
+    """Opens an existing segment without making this process its owner."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # Otherwise the resource tracker unlinks the writer's segment when
+        # this reader exits
+        if name not in _created:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class RingWriter:
+    def __init__(self, name, record_size, capacity=DEFAULT_CAPACITY):
+        self.name = name
+        self.record_size = record_size
+        self.capacity = capacity
+        self.slot_size = slot_size(record_size)
+        size = HEADER_SIZE + capacity * self.slot_size
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a writer that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created.add(name)
+        self.buf = self.shm.buf
+        self.head = 0
+        RING_HEADER.pack_into(self.buf, 0, 0, record_size, capacity)
+
+    def write(self, record):
+        """Appends one record; returns its sequence number (1, 2, ...)"""
+        if len(record) != self.record_size:
+            raise ValueError(f"{self.name}: record of {len(record)} bytes, expected {self.record_size}")
+        seq = self.head + 1
+        offset = HEADER_SIZE + (self.head % self.capacity) * self.slot_size
+        SLOT_SEQ.pack_into(self.buf, offset, 2 * seq - 1)
+        start = offset + SLOT_SEQ.size
+        self.buf[start:start + self.record_size] = record
+        SLOT_SEQ.pack_into(self.buf, offset, 2 * seq)
+        self.head = seq
+        RING_HEADER.pack_into(self.buf, 0, seq, self.record_size, self.capacity)
+        return seq
+
+    def close(self, unlink=True):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+            _created.discard(self.name)
+
+
+class RingReader:
+    """Reads a ring created by RingWriter; raises FileNotFoundError if absent."""
+
+    def __init__(self, name):
+        self.name = name
+        self.shm = attach(name)
+        self.buf = self.shm.buf
+        _, self.record_size, self.capacity = RING_HEADER.unpack_from(self.buf)
+        self.slot_size = slot_size(self.record_size)
+        self.position = self.head()  # only records written after attaching are new
+        self.lost = 0  # records overwritten before they were read
+
+    def head(self):
+        return RING_HEADER.unpack_from(self.buf)[0]
+
+    def read(self, seq):
+        """Record seq, or None if it has been overwritten"""
+        offset = HEADER_SIZE + ((seq - 1) % self.capacity) * self.slot_size
+        start = offset + SLOT_SEQ.size
+        for _ in range(READ_RETRIES):
+            (before,) = SLOT_SEQ.unpack_from(self.buf, offset)
+            if before > 2 * seq:
+                return None  # a newer record took the slot
+            if before == 2 * seq:
+                record = bytes(self.buf[start:start + self.record_size])
+                (after,) = SLOT_SEQ.unpack_from(self.buf, offset)
+                if after == before:
+                    return record
+            # otherwise the writer is mid-copy; look again
+        return None
+
+    def latest(self):
+        """(seq, record) of the newest record, or None if none was written"""
+        head = self.head()
+        while head:
+            record = self.read(head)
+            if record is not None:
+                return head, record
+            head = self.head()  # lapped while reading; try the new newest
+        return None
+
+    def read_new(self):
+        """(seq, record) pairs written since the previous call, oldest first"""
+        head = self.head()
+        records = []
+        if head - self.position > self.capacity:
+            self.lost += head - self.position - self.capacity
+            self.position = head - self.capacity
+        while self.position < head:
+            seq = self.position + 1
+            record = self.read(seq)
+            if record is None:
+                self.lost += 1
+            else:
+                records.append((seq, record))
+            self.position = seq
+        return records
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
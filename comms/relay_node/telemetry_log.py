@@ -0,0 +1,153 @@
+"""Record raw BLE tracker notifications and replay them without hardware.
+
+A log is a small file header followed by one record per notification:
+nanoseconds since the recording started, device index, payload length and
+the untouched payload bytes (binary TelemetryPacket or legacy JSON).
+
+Replay feeds logs through the same decode/forward path as
+biometrics_receiver_server, so the relay's port 5555 ingestion can be
+exercised at any speed and with any number of simulated trackers:
+
+    python telemetry_log.py session.bin --speed 10
+    python telemetry_log.py a.bin b.bin --copies 50 --speed 0 --loop
+
+Like the live receiver, replay coalesces bursts to the newest sample per
+tracker; --no-coalesce forwards every notification for throughput runs.
+"""
+import argparse
+import asyncio
+import heapq
+import struct
+import time
+
+from biometrics_receiver_server import RelayForwarder, make_notification_handler
+
+LOG_MAGIC = b"BLTL"
+LOG_VERSION = 1
+FILE_HEADER = struct.Struct("<4s B x H d")  # magic, version, record header size, wall-clock start
+RECORD_HEADER = struct.Struct("<Q H H")  # ns since start, device, payload length
+WRITE_BUFFER = 64 * 1024
+
+
+class TelemetryRecorder:
+    """Appends notifications to a log; write() only touches an in-memory buffer."""
+
+    def __init__(self, path):
+        self.file = open(path, "wb", buffering=WRITE_BUFFER)
+        self.start_ns = time.monotonic_ns()
+        self.records = 0
+        self.file.write(FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION, RECORD_HEADER.size, time.time()))
+
+    def write(self, device, data):
+        self.file.write(RECORD_HEADER.pack(time.monotonic_ns() - self.start_ns, device, len(data)))
+        self.file.write(data)
+        self.records += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_log(path):
+    """Yields (offset_ns, device, payload) for every record in a log."""
+    with open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            raise ValueError(f"{path}: not a telemetry log")
+        magic, version, record_header_size, _ = FILE_HEADER.unpack(header)
+        if magic != LOG_MAGIC or version != LOG_VERSION or record_header_size != RECORD_HEADER.size:
+            raise ValueError(f"{path}: unsupported telemetry log (version {version})")
+
+        while True:
+            record = f.read(RECORD_HEADER.size)
+            if len(record) < RECORD_HEADER.size:
+                return
+            offset_ns, device, length = RECORD_HEADER.unpack(record)
+            payload = f.read(length)
+            if len(payload) < length:
+                return  # truncated by an interrupted recording
+            yield offset_ns, device, payload
+
+
+def load_streams(paths, copies=1):
+    """Loads logs into memory and gives every (log, copy, device) its own index.
+
+    Returns a list of (offset_ns, device_index, payload) lists, one per
+    simulated tracker stream.
+    """
+    streams = []
+    for path in paths:
+        records = list(read_log(path))
+        recorded_devices = sorted({device for _, device, _ in records})
+        for _ in range(copies):
+            for recorded in recorded_devices:
+                index = len(streams) + 1
+                streams.append([(t, index, payload) for t, device, payload in records if device == recorded])
+    return streams
+
+
+async def replay(streams, forwarder, speed=1.0, loop=False):
+    """Pushes records into the forwarder at their recorded pace divided by speed.
+
+    speed <= 0 replays as fast as the forwarder can keep up; it then waits
+    for queue space instead of letting the forwarder shed samples.
+    """
+    handlers = {}
+    replayed = 0
+    while True:
+        started = time.perf_counter()
+        for offset_ns, device, payload in heapq.merge(*streams, key=lambda record: record[0]):
+            if speed > 0:
+                delay = offset_ns / 1e9 / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                while forwarder.queue.full():
+                    await asyncio.sleep(0.001)
+            handler = handlers.get(device)
+            if handler is None:
+                handler = handlers[device] = make_notification_handler(device, forwarder)
+            handler(0, bytearray(payload))
+            replayed += 1
+        if not loop:
+            return replayed
+
+
+async def main(args):
+    streams = load_streams(args.logs, args.copies)
+    total = sum(len(stream) for stream in streams)
+    print(f"Replaying {total} notifications from {len(streams)} tracker streams at "
+          f"{'max' if args.speed <= 0 else f'{args.speed:g}x'} speed")
+
+    forwarder = RelayForwarder(args.host, args.port, coalescing=not args.no_coalesce)
+    forward_task = asyncio.create_task(forwarder.run())
+    started = time.perf_counter()
+    try:
+        replayed = await replay(streams, forwarder, args.speed, args.loop)
+        # give the forwarder a moment to flush what is still queued
+        for _ in range(40):
+            if forwarder.queue.empty():
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        forward_task.cancel()
+    elapsed = time.perf_counter() - started
+    # Unless --no-coalesce, bursts reach the relay as one sample per device,
+    # so the relay's ingestion rate is the forwarded rate, not the replayed one
+    print(f"Replayed {replayed} notifications in {elapsed:.2f}s ({replayed / elapsed:.0f}/s); "
+          f"forwarded to the relay {forwarder.sent} ({forwarder.sent / elapsed:.0f}/s), dropped {forwarder.dropped}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded BLE telemetry into the relay")
+    parser.add_argument("logs", nargs="+", help="log files written with --record")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed multiplier, 0 for max")
+    parser.add_argument("--copies", type=int, default=1, help="simulated trackers per recorded tracker")
+    parser.add_argument("--loop", action="store_true", help="replay forever")
+    parser.add_argument("--no-coalesce", action="store_true",
+                        help="forward every notification instead of the newest per device (throughput runs)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5555)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        print("\nReplay stopped by user.")
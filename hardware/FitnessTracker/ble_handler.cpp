@@ -17,6 +17,7 @@ Mode lastSentMode = HR_ONLY;
 int lastSentHR = -1;
 int lastSentReps = -1;
 bool lastSentStart = false;
+uint32_t telemetrySeq = 0;
 
 class MyServerCallbacks: public BLEServerCallbacks {
     void onConnect(BLEServer* pServer) {
@@ -52,6 +53,20 @@ void setup_ble() {
 void send_ble_data(Mode currentMode, int beatAvg, int repCount, bool exerciseStarted) {
   if (deviceConnected) {
     if (currentMode != lastSentMode || beatAvg != lastSentHR || repCount != lastSentReps || exerciseStarted != lastSentStart) {
+#if BLE_BINARY_TELEMETRY
+      TelemetryPacket packet;
+      packet.version = TELEMETRY_VERSION;
+      packet.mode = static_cast<uint8_t>(currentMode);
+      packet.start = exerciseStarted ? 1 : 0;
+      packet.reserved = 0;
+      packet.hr = static_cast<int16_t>(beatAvg);
+      packet.reps = static_cast<uint16_t>(repCount);
+      packet.seq = telemetrySeq++;
+      packet.timestamp_ms = millis();
+
+      pCharacteristic->setValue(reinterpret_cast<uint8_t*>(&packet), sizeof(packet));
+      pCharacteristic->notify();
+#else
       StaticJsonDocument<200> doc;
       String modeName = "HR Only";
       switch(currentMode) {
@@ -70,6 +85,7 @@ void send_ble_data(Mode currentMode, int beatAvg, int repCount, bool exerciseSta
       pCharacteristic->setValue(output.c_str());
       pCharacteristic->notify();
       Serial.println("Change detected, sent: " + output);
+#endif
 
       lastSentMode = currentMode;
       lastSentHR = beatAvg;
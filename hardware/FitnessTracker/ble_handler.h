@@ -2,6 +2,22 @@
 #define BLE_HANDLER_H
 
 #include "config.h"
+#include <stdint.h>
+
+// --- Binary telemetry layout (little-endian, 16 bytes) ---
+// Must match TELEMETRY_V1 in comms/relay_node/biometrics_receiver_server.py
+#define TELEMETRY_VERSION 1
+
+struct __attribute__((packed)) TelemetryPacket {
+  uint8_t version;       // TELEMETRY_VERSION
+  uint8_t mode;          // Mode enum value
+  uint8_t start;         // 1 once the get-ready period is over
+  uint8_t reserved;
+  int16_t hr;            // BPM, 0 when no finger is detected
+  uint16_t reps;
+  uint32_t seq;          // increments on every notification
+  uint32_t timestamp_ms; // millis() when the packet was built
+};
 
 void setup_ble();
 void send_ble_data(Mode currentMode, int beatAvg, int repCount, bool exerciseStarted);
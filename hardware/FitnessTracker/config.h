@@ -9,6 +9,10 @@ enum Mode {
   SQUAT
 };
 
+// --- BLE telemetry ---
+// 1 = packed binary TelemetryPacket (see ble_handler.h), 0 = legacy JSON
+#define BLE_BINARY_TELEMETRY 1
+
 // --- Button ---
 #define BUTTON_PIN 25
 
@@ -2,6 +2,7 @@ import asyncio
 import platform
 import json
 import os
+import struct
 
 from bleak import BleakClient, BleakScanner
 
@@ -10,6 +11,10 @@ DEVICE_NAME = "ESP32 Fitness Tracker"
 SERVICE_UUID = "4fafc201-1fb5-459e-8fcc-c5c9c331914b"
 CHARACTERISTIC_UUID = "beb5483e-36e1-4688-b7f5-ea07361b26a8"
 
+# Binary TelemetryPacket from FitnessTracker/ble_handler.h (BLE_BINARY_TELEMETRY)
+TELEMETRY_V1 = struct.Struct("<B B B x h H I I")
+MODE_NAMES = ("Hr Only", "Bicep Curl", "Lat Raise", "Squat")
+
 def clear_console():
     """Clears the console screen."""
     command = 'cls' if platform.system().lower() == 'windows' else 'clear'
@@ -17,10 +22,15 @@ def clear_console():
 
 def notification_handler(sender: int, data: bytearray):
     """Handles incoming data from the BLE characteristic."""
-    message = data.decode('utf-8')
     try:
-        # Parse the JSON string
-        sensor_data = json.loads(message)
+        if data[:1] != b'{' and len(data) == TELEMETRY_V1.size:
+            _, mode, start, hr, reps, seq, timestamp_ms = TELEMETRY_V1.unpack(data)
+            message = f"#{seq} @ {timestamp_ms} ms"
+            sensor_data = {'mode': MODE_NAMES[mode], 'hr': hr, 'reps': reps, 'start': bool(start)}
+        else:
+            # Parse the JSON string
+            message = data.decode('utf-8')
+            sensor_data = json.loads(message)
         
         # Clear the console for a clean display
         clear_console()
@@ -50,11 +60,11 @@ def notification_handler(sender: int, data: bytearray):
         
         # --- MODIFIED ---
         # Print raw JSON for debugging
-        print(f"Raw JSON: {message}")
+        print(f"Raw: {message}")
 
 
-    except json.JSONDecodeError:
-        print(f"Could not decode JSON: {message}")
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        print(f"Could not decode notification: {bytes(data)!r}")
     except Exception as e:
         print(f"An error occurred: {e}")
 